@@ -0,0 +1,39 @@
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from portfolioComponents.Position import Position
+from portfolioComponents.Portfolio import Portfolio
+from utilities.priceProviders import SyntheticProvider
+
+SIZES = [100, 500, 1000, 2000, 5000, 10000]
+
+def makePositions(count):
+    """
+     @brief Build a portfolio's worth of synthetic positions with equal target weights.
+     @param count Number of positions to build
+     @return A list of Position objects
+    """
+    return [Position([f"SYM{i}", str(1 / count), str(1 + i % 50)]) for i in range(count)]
+
+def timeDistribution(count, contribution = 10000):
+    """
+     @brief Time one calcDistribution and updatePortfolio pass on a synthetic portfolio.
+     @param count Number of positions in the portfolio
+     @param contribution Amount to distribute (default = 10000)
+     @return Elapsed seconds
+    """
+    portfolio = Portfolio(makePositions(count), priceProvider = SyntheticProvider())
+    start = perf_counter()
+    portfolio.calcDistribution(contribution)
+    portfolio.updatePortfolio()
+    return perf_counter() - start
+
+# Print the time per position for each size. A flat column means linear scaling
+if __name__ == "__main__":
+    print(f"{'Positions':>10} {'Seconds':>10} {'us/position':>12}")
+    for size in SIZES:
+        elapsed = timeDistribution(size)
+        print(f"{size:>10} {elapsed:>10.4f} {elapsed / size * 1e6:>12.2f}")
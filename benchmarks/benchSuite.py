@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import math
+import random
+import argparse
+import platform
+import tempfile
+from datetime import datetime
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from portfolioComponents.Portfolio import Portfolio
+from portfolioComponents.ArrayPortfolio import ArrayPortfolio
+from outputFormatting.Table import Table
+from utilities.readData import readPositionsFromFile
+from utilities.priceProviders import FileProvider
+from utilities.saveData import printTableToFile
+from utilities.Constants import FileConstants, TableNames
+
+SIZES = [10, 100, 1000, 10000, 100000, 1000000]
+STAGES = ["parse", "attach", "allocate", "update", "arrayAllocate", "arrayUpdate", "render", "write"]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "results")
+CONTRIBUTION = 10000
+# Stages faster than this at a size are too noisy to judge
+MIN_SECONDS = 0.002
+# A stage whose time grows faster than n ** SCALING_LIMIT over the larger sizes is reported. Linear passes over dictionaries
+# already fit about n ** 1.3 once the portfolio no longer fits in cache, while an O(n^2) lookup fits about n ** 2
+SCALING_LIMIT = 1.5
+# Only sizes from here up are used to fit the scaling, below it fixed costs dominate
+SCALING_FROM = 1000
+# A stage that takes this many times longer than in the baseline is reported
+SLOWDOWN_LIMIT = 1.5
+
+def writeSyntheticFiles(count, directory, seed = 0):
+    """
+     @brief Write a holdings CSV and a JSON quote snapshot of synthetic positions.
+     @param count Number of positions
+     @param directory Directory to write the files to
+     @param seed Seed of the random weights, shares and prices (default = 0)
+     @return Tuple of the holdings and quote file paths
+    """
+    rng = random.Random(seed)
+    weights = [rng.random() for _ in range(count)]
+    weightSum = sum(weights)
+    holdingsPath = os.path.join(directory, f"holdings{count}.csv")
+    quotesPath = os.path.join(directory, f"quotes{count}.json")
+    with open(holdingsPath, "w") as f:
+        f.write("Symbol,Percent,Shares\n")
+        f.writelines(f"SYM{i},{weight / weightSum:.10f},{rng.randint(0, 500)}\n" for i, weight in enumerate(weights))
+    with open(quotesPath, "w") as f:
+        json.dump({f"SYM{i}" : round(rng.uniform(5, 500), 2) for i in range(count)}, f)
+    return holdingsPath, quotesPath
+
+def timeStage(function):
+    """
+     @brief Time one call of a function.
+     @param function The function to call
+     @return Tuple of the elapsed seconds and the function's result
+    """
+    start = perf_counter()
+    result = function()
+    return perf_counter() - start, result
+
+def runSize(count, directory, repeat = 3):
+    """
+     @brief Time every stage of a run on one synthetic portfolio. Prices come from the quote snapshot, so nothing goes to the
+        network. Each stage is run repeat times on fresh inputs and the fastest time is kept
+     @param count Number of positions
+     @param directory Directory for the synthetic files and the written tables
+     @param repeat Number of times to run every stage (default = 3)
+     @return A dictionary of stage name to seconds
+    """
+    holdingsPath, quotesPath = writeSyntheticFiles(count, directory)
+    times = {stage : math.inf for stage in STAGES}
+
+    def record(stage, function):
+        elapsed, result = timeStage(function)
+        times[stage] = min(times[stage], elapsed)
+        return result
+
+    for _ in range(repeat):
+        positions = record("parse", lambda: readPositionsFromFile(holdingsPath, snapshotDir = None))
+        portfolio = record("attach", lambda: Portfolio(positions, priceProvider = FileProvider(quotesPath)))
+        arrayPortfolio = ArrayPortfolio.fromPortfolio(portfolio)
+
+        record("allocate", lambda: portfolio.calcDistribution(CONTRIBUTION))
+        changes = record("update", lambda: portfolio.updatePortfolio())
+        record("arrayAllocate", lambda: arrayPortfolio.calcDistribution(CONTRIBUTION))
+        record("arrayUpdate", lambda: arrayPortfolio.updatePortfolio())
+
+        buyTable, positionTable = record("render", lambda: (
+            Table.renderTable(Table.createChangesTable(portfolio.latestPrices, changes), use3Places = True),
+            portfolio.renderPositions()))
+        record("write", lambda: (printTableToFile(buyTable.toPipe(), TableNames.BUY_AMOUNTS),
+                                 printTableToFile(positionTable.toPipe(), TableNames.UPDATED_PORTFOLIO)))
+    return times
+
+def getScaling(results):
+    """
+     @brief Fit how each stage's time grows with the number of positions, as the slope of log(time) against log(size) over
+        the sizes from SCALING_FROM up. 1 is linear, 2 is quadratic
+     @param results A dictionary of size to a dictionary of stage name to seconds
+     @return A dictionary of stage name to the fitted exponent, for the stages with at least two usable sizes
+    """
+    scaling = {}
+    for stage in STAGES:
+        points = [(math.log(size), math.log(times[stage])) for size, times in results.items()
+                  if size >= SCALING_FROM and times[stage] >= MIN_SECONDS]
+        if len(points) < 2:
+            continue
+        meanX = sum(x for x, _ in points) / len(points)
+        meanY = sum(y for _, y in points) / len(points)
+        scaling[stage] = sum((x - meanX) * (y - meanY) for x, y in points) / sum((x - meanX) ** 2 for x, _ in points)
+    return scaling
+
+def findRegressions(report, baseline = None):
+    """
+     @brief List the stages that scale worse than linear, and with a baseline, the stages that got slower.
+     @param report A report as built by L { runSuite }
+     @param baseline An earlier report to compare to (default = None)
+     @return A list of descriptions of the regressions, empty if there are none
+    """
+    regressions = [f"{stage} grows as n^{exponent:.2f}, over the limit of n^{SCALING_LIMIT}"
+                   for stage, exponent in report["scaling"].items() if exponent > SCALING_LIMIT]
+    if baseline:
+        # JSON keys are strings, so sizes are compared as strings
+        for size, times in report["results"].items():
+            baseTimes = baseline["results"].get(size, {})
+            for stage, seconds in times.items():
+                baseSeconds = baseTimes.get(stage)
+                if baseSeconds and seconds >= MIN_SECONDS and seconds > baseSeconds * SLOWDOWN_LIMIT:
+                    regressions.append(f"{stage} at {size} positions took {seconds:.4f} s, {seconds / baseSeconds:.1f}x the "
+                                       f"baseline {baseSeconds:.4f} s")
+    return regressions
+
+def runSuite(sizes = SIZES, repeat = 3):
+    """
+     @brief Run every size and build a report. Output tables are written to a temporary directory instead of outputFiles
+     @param sizes Numbers of positions to run (default = SIZES)
+     @param repeat Number of times to run every stage per size (default = 3)
+     @return A dictionary with the machine, the seconds of every stage per size and the fitted scaling of every stage
+    """
+    results = {}
+    savePath, altSavePath = FileConstants.SAVE_PATH, FileConstants.ALT_SAVE_PATH
+    with tempfile.TemporaryDirectory() as directory:
+        FileConstants.SAVE_PATH = os.path.join(directory, FileConstants.OUTPUT_FILE_DIR)
+        FileConstants.ALT_SAVE_PATH = os.path.join(FileConstants.SAVE_PATH, FileConstants.ARCHIVE_FILE_DIR)
+        try:
+            print(f"{'Positions':>10} " + " ".join(f"{stage:>13}" for stage in STAGES))
+            for size in sizes:
+                results[size] = runSize(size, directory, repeat)
+                print(f"{size:>10} " + " ".join(f"{results[size][stage]:>13.4f}" for stage in STAGES))
+        finally:
+            FileConstants.SAVE_PATH, FileConstants.ALT_SAVE_PATH = savePath, altSavePath
+
+    return {"timestamp" : datetime.now().isoformat(timespec = "seconds"),
+            "python"    : platform.python_version(),
+            "machine"   : platform.platform(),
+            "repeat"    : repeat,
+            "results"   : {str(size) : times for size, times in results.items()},
+            "scaling"   : getScaling(results)}
+
+# Time every stage at every size, save the report and exit with an error on a regression
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Time the stages of a run on synthetic portfolios of increasing size.")
+    parser.add_argument("--sizes", default = ",".join(map(str, SIZES)),
+                        help = "Comma separated numbers of positions (default = 10 to 1,000,000)")
+    parser.add_argument("--repeat", type = int, default = 3,
+                        help = "Times to run every stage per size, keeping the fastest (default = 3)")
+    parser.add_argument("--output", default = None,
+                        help = "Path of the JSON report (default = benchmarks/results/bench-<time>.json)")
+    parser.add_argument("--baseline", default = None,
+                        help = "An earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    report = runSuite([int(size) for size in args.sizes.split(",")], args.repeat)
+    print("\nScaling: " + ", ".join(f"{stage} n^{exponent:.2f}" for stage, exponent in report["scaling"].items()))
+
+    outputPath = args.output or os.path.join(RESULTS_DIR, f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(outputPath)), exist_ok = True)
+    with open(outputPath, "w") as f:
+        json.dump(report, f, indent = 2)
+    print(f"Saved {outputPath}")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = findRegressions(report, baseline)
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,72 @@
+import os
+import sys
+import argparse
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.insert(0, ROOT_DIR)
+
+from utilities.Constants import FileConstants
+
+# Importing main must stay under this many milliseconds, measured by -X importtime
+BUDGET_MS = 250
+# Only the code paths that use these may import them
+LAZY_MODULES = ["yfinance", "pandas", "pytz", "tabulate", "http.server", "concurrent.futures.process"]
+
+def measureImports(module = "main"):
+    """
+     @brief Import a module in a fresh interpreter with -X importtime and collect what it imported.
+     @param module The module to import (default = "main")
+     @return A dictionary of every imported module to its cumulative import time in milliseconds
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd = ROOT_DIR,
+                            capture_output = True, text = True, check = True)
+    imports = {}
+    # Lines look like "import time:  self [us] | cumulative | imported package", with the package indented by depth
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imports[name.strip()] = int(cumulative) / 1000
+    return imports
+
+def checkImportTime(budgetMs = BUDGET_MS, repeat = 5):
+    """
+     @brief Check that importing main stays fast and free of side effects. The best of several runs is used so a busy machine
+        does not fail the check
+     @param budgetMs Import time budget of main in milliseconds (default = BUDGET_MS)
+     @param repeat Number of fresh interpreters to measure (default = 5)
+     @return A list of the problems found, empty if there are none
+    """
+    outputExisted = os.path.exists(FileConstants.SAVE_PATH)
+    runs = [measureImports() for _ in range(repeat)]
+    problems = []
+
+    bestMs = min(imports["main"] for imports in runs)
+    print(f"import main: {bestMs:.1f} ms (budget {budgetMs} ms, best of {repeat})")
+    if bestMs > budgetMs:
+        slowest = sorted(runs[0].items(), key = lambda item: item[1], reverse = True)[1:6]
+        problems.append(f"import main took {bestMs:.1f} ms, over the budget of {budgetMs} ms. Slowest imports: " +
+                        ", ".join(f"{name} {ms:.1f} ms" for name, ms in slowest))
+
+    eagerModules = [name for name in LAZY_MODULES if name in runs[0]]
+    if eagerModules:
+        problems.append(f"import main loaded {', '.join(eagerModules)}, which should only be imported where they are used")
+    if not outputExisted and os.path.exists(FileConstants.SAVE_PATH):
+        problems.append(f"import main created {FileConstants.SAVE_PATH}")
+    return problems
+
+# Exit with an error when main imports too slowly or imports something it should not
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Check the import time and import side effects of main.py.")
+    parser.add_argument("--budget", type = float, default = BUDGET_MS,
+                        help = f"Import time budget in milliseconds (default = {BUDGET_MS})")
+    parser.add_argument("--repeat", type = int, default = 5,
+                        help = "Number of fresh interpreters to measure (default = 5)")
+    args = parser.parse_args()
+
+    problems = checkImportTime(args.budget, args.repeat)
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
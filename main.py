@@ -1,8 +1,25 @@
+import os
 import sys
-import traceback
-from utilities.readData import getPortfolioFromFile
-from outputFormatting.Table import Table, printPortfolioTable
-from utilities.Constants import TableNames
+import json
+import argparse
+from datetime import date
+from time import perf_counter
+from utilities.readData import getPortfolioFromFile, readPositionsFromFile
+from utilities.priceHistory import readPriceHistory
+from utilities.historyStore import PriceHistoryStore
+from portfolioComponents.Backtest import Backtest
+from portfolioComponents.ArrayPortfolio import ArrayPortfolio
+from outputFormatting.Table import Table, printPortfolioTable, printGroupTable
+from outputFormatting.TableRenderer import RenderedTable
+from utilities.Constants import TableNames, BatchConstants, HistoryConstants, SnapshotConstants, FloatStringFormat, \
+                               RunHistoryConstants, ServiceConstants
+from utilities.saveData import writeAllocationMatrix, printTableToFile
+from utilities.contributionStream import parseAmounts, readContributionLines, parseContribution, ResultWriter
+from utilities.quoteCache import QuoteCache
+from utilities.runHistory import RunHistory
+from utilities.portfolioSnapshot import PortfolioSnapshot
+from utilities.priceProviders import getPriceProvider, YFinanceProvider
+from utilities.priceStream import readTicksFromFile, pollProvider
 
 def getContributionInput():
     """
@@ -16,38 +33,318 @@ def getContributionInput():
     valueToAdd = float(valueToAdd)
     return valueToAdd
     
-def calculateChanges(portfolio):
+def calculateChanges(portfolio, contributionAmount, wholeShares = False, lotSize = 1):
     """
-     @brief Calculates the changes to the portfolio and updates the portfolio. This is a wrapper around L { getContributionInput } 
-        to calculate the contribution and then calls L { updatePortfolio }
+     @brief Calculates the changes to the portfolio and updates the portfolio. This is a wrapper around calcDistribution
+        that then calls L { updatePortfolio }
      @param portfolio The portfolio to calculate the changes for
+     @param contributionAmount The amount to contribute
+     @param wholeShares Boolean to buy whole lots of shares only (default = False)
+     @param lotSize Number of shares in one lot when buying whole lots (default = 1)
      @return A list of changes to each position
     """
-    contributionAmount = getContributionInput()
-    portfolio.calcDistribution(contributionAmount)
+    # Whole lots leave some of the contribution uninvested
+    if wholeShares:
+        portfolio.calcWholeShareDistribution(contributionAmount, defaultLotSize = lotSize)
+        print(f"Uninvested cash: ${portfolio.uninvestedCash:.2f}")
+    else:
+        portfolio.calcDistribution(contributionAmount)
     changes = portfolio.updatePortfolio()
     return changes
 
+def watchPrices(portfolio, tickStream, contributionAmount):
+    """
+     @brief Refresh the buy table every time new prices arrive. The contribution is previewed, never applied to the portfolio
+     @param portfolio The portfolio to keep up to date
+     @param tickStream Iterable of dictionaries of prices keyed by symbol
+     @param contributionAmount The amount to distribute on every refresh
+    """
+    try:
+        # Only the ticked positions are revalued before the distribution is recalculated
+        for ticks in tickStream:
+            start = perf_counter()
+            updatedSymbols = portfolio.applyPriceTicks(ticks)
+            if not updatedSymbols:
+                continue
+            changes = portfolio.previewDistribution(contributionAmount)
+            elapsedMs = (perf_counter() - start) * 1000
+            Table.printOutput(portfolio, changes, saveToFile = False)
+            print(f"Updated {', '.join(updatedSymbols)} in {elapsedMs:.2f} ms")
+    except KeyboardInterrupt:
+        print("\nStopped watching prices")
+
+def runStream(portfolio, args):
+    """
+     @brief Calculate a stream of contributions against one portfolio without asking for input. The portfolio and its prices
+        are read once and kept for the whole stream, and the result of every contribution is written as soon as it is known.
+        A contribution that cannot be read is reported and the stream carries on
+     @param portfolio The portfolio to contribute to
+     @param args argparse Namespace with the stream options
+    """
+    writer = ResultWriter(args.format)
+    runHistory = RunHistory() if args.apply and not args.no_history else None
+    # The file was read once for the whole stream, so every recorded run shares its fingerprint
+    fingerprint = PortfolioSnapshot().getFingerprint(args.filename) if runHistory else None
+    try:
+        for lineNumber, line in readContributionLines(args.stream):
+            try:
+                amountId, amount = parseContribution(line)
+            except ValueError as e:
+                writer.writeError(lineNumber, f"{e} ({line})")
+                continue
+
+            # Applied contributions build on each other, previews are all made against the portfolio as it was read
+            if args.apply:
+                portfolio.calcDistribution(amount)
+                changes = dict(portfolio.updatePortfolio())
+                balance = portfolio.balance
+                if runHistory:
+                    runHistory.recordRun(portfolio, changes, amount, args.filename, fingerprint)
+            else:
+                changes = dict(portfolio.previewDistribution(amount))
+                balance = portfolio.balance + sum(changes.values())
+            writer.writeResult(lineNumber, amountId, amount, changes, balance)
+
+            # Tables go to standard error so they never mix with the results
+            if args.tables or args.save_tables:
+                renderedTable = Table.renderTable(Table.createChangesTable(portfolio.latestPrices, changes), use3Places = True)
+                if args.tables:
+                    print(f"\n{TableNames.BUY_AMOUNTS} ({amount:,.2f}):\n\n{renderedTable.toFancyGrid()}", file = sys.stderr)
+                if args.save_tables:
+                    printTableToFile(renderedTable.toPipe(), TableNames.BUY_AMOUNTS)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if runHistory:
+            runHistory.close()
+
+def printRunHistory(symbol, since):
+    """
+     @brief Print the total bought of a symbol and its weight after every recorded run since a date.
+     @param symbol The symbol to look up
+     @param since First date to include, None for January 1st of this year
+    """
+    since = since or date(date.today().year, 1, 1)
+    runHistory = RunHistory()
+    totalBought = runHistory.getTotalBought(symbol, since)
+    weightHistory = runHistory.getWeightHistory(symbol, since)
+    runHistory.close()
+
+    tableRows = [["Run", "Desired (%)", "Actual (%)", "Bought ($)"]]
+    tableRows.extend([runTime.strftime("%Y-%m-%d %H:%M:%S"), target, weight, change]
+                     for runTime, weight, target, change in weightHistory)
+    formats = [FloatStringFormat.STRING_FORMAT, FloatStringFormat.PERCENT_2_PLACES, FloatStringFormat.PERCENT_2_PLACES,
+               FloatStringFormat.FLOAT_2_PLACES]
+    print(RenderedTable(tableRows, formats).toFancyGrid())
+    print(f"{symbol}: bought ${totalBought:,.2f} over {len(weightHistory)} runs since {since.isoformat()}")
+
+def runBacktest(args, priceProvider):
+    """
+     @brief Replay a contribution policy for the positions of the portfolio file over historical prices and print the report.
+     @param args argparse Namespace with the backtest options
+     @param priceProvider PriceProvider to fetch the history from when the source is not a file
+     @return The BacktestResult
+    """
+    positions = readPositionsFromFile(args.filename, None if args.no_snapshot else SnapshotConstants.SNAPSHOT_PATH)
+    symbols = [position.symbol for position in positions]
+    # History comes from a wide CSV file or from the price provider
+    if os.path.isfile(args.backtest):
+        dates, symbols, prices = readPriceHistory(args.backtest, symbols)
+    else:
+        end = date.today()
+        start = end.replace(year = end.year - args.years)
+        historyProvider = getPriceProvider(args.backtest, args.seed)
+        # With a local store only the days it is missing are fetched
+        if args.history_store:
+            store = PriceHistoryStore(args.history_store, start)
+            store.update(historyProvider, symbols)
+            dates, symbols, prices = store.getPrices(symbols, start, end)
+        else:
+            dates, prices = historyProvider.fetchHistory(symbols, start, end)
+    
+    backtest = Backtest(dates, symbols, prices, [position.percentWanted for position in positions],
+                        ignore = [position.ignore for position in positions])
+    result = backtest.run(backtest.getSchedule(args.amount, args.frequency))
+    summary = result.getSummary()
+    
+    print(f"\nBacktest {summary['startDate']} to {summary['endDate']}, {summary['contributions']} contributions:\n")
+    for key, value in summary.items():
+        print(f"  {key:<20} {value:,.6g}" if isinstance(value, float) else f"  {key:<20} {value}")
+    # Save the full report when asked to
+    if args.backtest_output:
+        with open(args.backtest_output, "w") as f:
+            json.dump({"summary" : summary, "symbolDrift" : result.getSymbolDrift()}, f, indent = 2)
+    return result
+
+def parseArguments():
+    """
+     @brief Parse the command line arguments.
+     @return argparse Namespace with the parsed arguments
+    """
+    parser = argparse.ArgumentParser(description = "Determine contributions to a portfolio based on defined weights and current values.")
+    parser.add_argument("filename", nargs = "?", default = "",
+                        help = "Path to the portfolio CSV file. Searches the project directory when omitted")
+    parser.add_argument("--no-snapshot", action = "store_true",
+                        help = "Always parse the portfolio file instead of loading the snapshot saved by the last run")
+    parser.add_argument("--no-history", action = "store_true",
+                        help = "Do not record the run in the run history")
+    parser.add_argument("--show-history", default = None, metavar = "SYMBOL",
+                        help = "Print the total bought of SYMBOL and its weight after every recorded run since --since")
+    parser.add_argument("--since", type = date.fromisoformat, default = None, metavar = "YYYY-MM-DD",
+                        help = "First date for --show-history (default = January 1st of this year)")
+    parser.add_argument("--prices", default = None, metavar = "SOURCE",
+                        help = "Price source: 'yfinance' (default), 'synthetic', or the path to a JSON/CSV quote snapshot")
+    parser.add_argument("--seed", type = int, default = 0,
+                        help = "Seed for the synthetic price source (default = 0)")
+    parser.add_argument("--engine", choices = ["object", "array"], default = "object",
+                        help = "Calculation engine: 'object' works on Position objects, 'array' on NumPy arrays (default = object)")
+    parser.add_argument("--whole-shares", action = "store_true",
+                        help = "Only buy whole shares (or whole lots with --lot-size), keeping the rest as cash")
+    parser.add_argument("--lot-size", type = int, default = 1,
+                        help = "Number of shares in one lot with --whole-shares (default = 1)")
+    parser.add_argument("--amount", type = float, default = None,
+                        help = "Amount to contribute. Asked for interactively when omitted, except with --batch and --backtest")
+    parser.add_argument("--sweep", default = None, metavar = "AMOUNTS",
+                        help = "Print the allocation of many contribution amounts as CSV without changing the portfolio. "
+                               "AMOUNTS is a comma separated list or an inclusive start:stop:step range")
+    parser.add_argument("--sweep-output", default = None, metavar = "PATH",
+                        help = "Write the --sweep CSV to PATH instead of standard output")
+    parser.add_argument("--stream", default = None, metavar = "AMOUNTS",
+                        help = "Calculate many contributions without asking for input and write one result per contribution. "
+                               "AMOUNTS is '-' to read from standard input, a file, or a list as for --sweep. Lines of a stream are "
+                               "an amount or a JSON object such as {\"id\": \"a1\", \"amount\": 250}")
+    parser.add_argument("--format", choices = ResultWriter.FORMATS, default = "json",
+                        help = "Result format of --stream: one JSON object per line or CSV (default = json)")
+    parser.add_argument("--apply", action = "store_true",
+                        help = "Apply every --stream contribution to the portfolio in turn instead of previewing each one on its own")
+    parser.add_argument("--tables", action = "store_true",
+                        help = "Also print the buy table of every --stream contribution to standard error")
+    parser.add_argument("--save-tables", action = "store_true",
+                        help = "Also write the buy table of every --stream contribution to its output file")
+    parser.add_argument("--serve", nargs = "?", const = f"{ServiceConstants.DEFAULT_HOST}:{ServiceConstants.DEFAULT_PORT}",
+                        default = None, metavar = "ADDRESS",
+                        help = "Serve allocation requests over HTTP for the portfolio file, or every CSV file of a directory. "
+                               "ADDRESS is host:port or the path of a Unix socket. Prices are refreshed every --interval seconds")
+    parser.add_argument("--batch", default = None, metavar = "PATH",
+                        help = "Calculate many accounts at once. PATH is a directory of portfolio CSV files or a manifest "
+                               "with one 'path[, amount]' per line. Accounts without an amount use --amount")
+    parser.add_argument("--batch-output", default = BatchConstants.OUTPUT_PATH, metavar = "DIR",
+                        help = "Directory to write one output file per --batch account to")
+    parser.add_argument("--workers", type = int, default = None,
+                        help = "Number of worker processes for --batch (default = number of CPUs)")
+    parser.add_argument("--backtest", default = None, metavar = "HISTORY",
+                        help = "Replay --amount contributions at --frequency over historical prices. HISTORY is a wide CSV "
+                               "of dates by symbols, 'yfinance' or 'synthetic'")
+    parser.add_argument("--years", type = int, default = 20,
+                        help = "Years of history to fetch for --backtest from a price source (default = 20)")
+    parser.add_argument("--history-store", nargs = "?", const = HistoryConstants.STORE_PATH, default = None, metavar = "DIR",
+                        help = "Keep --backtest price history from a price source in a local store in DIR and only fetch "
+                               "the days it is missing")
+    parser.add_argument("--frequency", default = "monthly",
+                        help = "Contribution frequency for --backtest: daily, weekly, monthly or a number of trading days "
+                               "(default = monthly)")
+    parser.add_argument("--backtest-output", default = None, metavar = "PATH",
+                        help = "Write the --backtest summary and per-symbol drift to PATH as JSON")
+    parser.add_argument("--watch", default = None, metavar = "TICKS",
+                        help = "Keep refreshing the buy table as prices change. TICKS is 'poll' to poll the price source, "
+                               "a tick file to read, or '-' to read ticks from standard input")
+    parser.add_argument("--follow", action = "store_true",
+                        help = "With a --watch tick file, wait for new lines at the end of the file")
+    parser.add_argument("--interval", type = float, default = 60,
+                        help = "Seconds between polls with --watch poll and price refreshes with --serve (default = 60)")
+    return parser.parse_args()
+
 # This is the main function of the program. It takes a file path as an argument
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        filename = ""
-    elif len(sys.argv) == 2:
-        try:
-            filename = sys.argv[1]
-        except IndexError:
-            print("A File Path must be included as a parameter")
-            traceback.print_exc()
-        except Exception:
-            traceback.print_exc()
-    else:
-        raise Exception("Only a File Path is an acceptable parameter")
+    args = parseArguments()
+    
+    # Offline price sources bypass the quote cache so they never mix with live quotes
+    priceProvider = getPriceProvider(args.prices, args.seed)
+    quoteCache = QuoteCache() if isinstance(priceProvider, YFinanceProvider) else None
+    
+    # Reading the run history needs neither the portfolio file nor prices
+    if args.show_history:
+        printRunHistory(args.show_history, args.since)
+        sys.exit(0)
     
-    # Get portfolio from file and create Portfolio Object. Print it to console.    
-    portfolio = getPortfolioFromFile(filename)
+    # A service loads its portfolios once and answers allocation requests until it is stopped
+    if args.serve:
+        if not args.filename:
+            raise Exception("--serve needs the path of a portfolio file or a directory of them")
+        # The service and batch modes bring in the HTTP server and process pool, so they are imported when used
+        from utilities.batchRunner import getBatchJobs
+        from utilities.allocationService import AllocationService, serve
+        filenames = [filename for filename, _ in getBatchJobs(args.filename)] if os.path.isdir(args.filename) else [args.filename]
+        service = AllocationService(filenames, quoteCache, priceProvider, None if args.no_snapshot else SnapshotConstants.SNAPSHOT_PATH)
+        serve(service, args.serve, args.interval)
+        sys.exit(0)
+    
+    # Batch mode prices the symbols of every account once and calculates the accounts in parallel
+    if args.batch:
+        from utilities.batchRunner import getBatchJobs, runBatch
+        jobs = getBatchJobs(args.batch, args.amount)
+        for filename, total, result in runBatch(jobs, args.batch_output, quoteCache, priceProvider, args.workers,
+                                                None if args.no_history else RunHistoryConstants.DB_PATH,
+                                                None if args.no_snapshot else SnapshotConstants.SNAPSHOT_PATH):
+            print(f"{filename}: bought ${total:,.2f} -> {result}")
+        sys.exit(0)
+    
+    # A backtest only needs the targets from the portfolio file, not today's prices
+    if args.backtest:
+        if not args.amount:
+            raise Exception("--backtest needs a contribution --amount")
+        runBacktest(args, priceProvider)
+        sys.exit(0)
+    
+    # Nobody is there to confirm a file found by searching when contributions are streamed
+    if args.stream and not args.filename:
+        raise Exception("--stream needs the path of the portfolio file")
+    
+    # Get portfolio from file and create Portfolio Object.
+    portfolio = getPortfolioFromFile(args.filename, quoteCache, priceProvider, None if args.no_snapshot else SnapshotConstants.SNAPSHOT_PATH)
+    if args.engine == "array":
+        if args.whole_shares:
+            raise Exception("--whole-shares is only supported by the object engine")
+        portfolio = ArrayPortfolio.fromPortfolio(portfolio)
+    
+    # A sweep evaluates every amount against the one price snapshot and leaves the portfolio unchanged
+    if args.sweep:
+        amounts = parseAmounts(args.sweep)
+        arrayPortfolio = portfolio if args.engine == "array" else ArrayPortfolio.fromPortfolio(portfolio)
+        allocations = arrayPortfolio.sweepDistribution(amounts)
+        writeAllocationMatrix(arrayPortfolio.symbols, amounts, allocations, args.sweep_output)
+        sys.exit(0)
+    
+    # A stream of contributions writes machine readable results instead of tables
+    if args.stream:
+        runStream(portfolio, args)
+        sys.exit(0)
+    
+    # Print the portfolio to console.
     printPortfolioTable(portfolio, TableNames.CURRENT_PORTOLIO)
+    printGroupTable(portfolio, TableNames.CURRENT_GROUPS)
+    
+    # Watch mode previews the same contribution against every price change
+    if args.watch:
+        contributionAmount = args.amount or getContributionInput()
+        Table.printOutput(portfolio, portfolio.previewDistribution(contributionAmount), saveToFile = False)
+        if args.watch == "poll":
+            symbols = list(portfolio.latestPrices)
+            tickStream = pollProvider(symbols, priceProvider, args.interval)
+        else:
+            tickStream = readTicksFromFile(args.watch, args.follow)
+        watchPrices(portfolio, tickStream, contributionAmount)
+        sys.exit(0)
     
     # Calculate changes to and update Portfolio. Print both changes and updated Portfolio.
-    portfolioChanges = calculateChanges(portfolio)
+    contributionAmount = args.amount or getContributionInput()
+    portfolioChanges = calculateChanges(portfolio, contributionAmount, args.whole_shares, args.lot_size)
+    # Keep a record of the run next to the output files
+    if not args.no_history:
+        fingerprint = PortfolioSnapshot().getFingerprint(args.filename) if args.filename else None
+        runHistory = RunHistory()
+        runHistory.recordRun(portfolio, portfolioChanges, contributionAmount, args.filename or None, fingerprint)
+        runHistory.close()
     Table.printOutput(portfolio, portfolioChanges)
     printPortfolioTable(portfolio, TableNames.UPDATED_PORTFOLIO)
+    printGroupTable(portfolio, TableNames.UPDATED_GROUPS)
@@ -1,5 +1,5 @@
 from enum import Enum
-from tabulate import tabulate
+from outputFormatting.TableRenderer import RenderedTable
 from utilities.saveData import printTableToFile
 from utilities.Constants import TableNames, FloatStringFormat
 
@@ -10,6 +10,8 @@ class Column(Enum):
     QUANTITY       = 4
     CURRENT_VALUE  = 5
     CHANGE_VALUE   = 6
+    DRIFT          = 7
+    GROUP          = 8
     
     TABLE_HEADERS  = {SYMBOL         : "Symbol", 
                       PERCENT_WANTED : "Desired Weight (%)",
@@ -17,7 +19,9 @@ class Column(Enum):
                       QUANTITY       : "Quantity (Shares)", 
                       CURRENT_VALUE  : "Current Value ($)"}
     
-    OTHER_HEADERS  = {CHANGE_VALUE   : "Buy Amount ($)"}
+    OTHER_HEADERS  = {CHANGE_VALUE   : "Buy Amount ($)",
+                      DRIFT          : "Drift (%)",
+                      GROUP          : "Group"}
         
     def getPositionRowData(columns, position, row):
         """
@@ -59,7 +63,7 @@ class Column(Enum):
             row.append(Column.TABLE_HEADERS.value[Column.PERCENT_ACTUAL.value])
         # Add the number of shares to the row.
         if Column.QUANTITY.value in columns:
-            row.append(Column.QUANTITY.value[Column.QUANTITY.value])
+            row.append(Column.TABLE_HEADERS.value[Column.QUANTITY.value])
         # Add the current value to the row.
         if Column.CURRENT_VALUE.value in columns:
             row.append(Column.TABLE_HEADERS.value[Column.CURRENT_VALUE.value])
@@ -112,49 +116,49 @@ class Table:
          @param use3Places Boolean to display floating points to 3 decimal places if True (default = False)
          @return A table that can be printed
         """
-        tableFormat = "pipe" if useForFile else "fancy_grid"
-        
-        return tabulate(tableRows, 
-                        headers  = "firstrow", 
-                        tablefmt = tableFormat,
-                        floatfmt = Table.getFloatFormat(tableRows, use3Places))
+        renderedTable = Table.renderTable(tableRows, use3Places)
+        return renderedTable.toPipe() if useForFile else renderedTable.toFancyGrid()
+    
+    def renderTable(tableRows, use3Places = False):
+        """
+         @brief Format the cells of a table once, for both the console and the file view.
+         @param tableRows The rows of the table. Must be a list of lists
+         @param use3Places Boolean to display floating points to 3 decimal places if True (default = False)
+         @return A RenderedTable whose toFancyGrid and toPipe give the console and file views
+        """
+        return RenderedTable(tableRows, Table.getColumnFormats(tableRows, use3Places))
         
-    def getFloatFormat(tableRows, use3Places = False):
+    def getColumnFormats(tableRows, use3Places = False):
         """
-         @brief Create a list of table rows to float format used by tabulate to display values in specific floating point format
-         @param tableRows list of rows from table
+         @brief Get the format of each column of a table from its header.
+         @param tableRows list of rows from table, headers first
          @param use3Places Boolean to display floating points to 3 decimal places if True (default = False)
-         @return list of floats formatted to display values in floating point format used by tabulate
+         @return list of format specs, one per column. Text columns have an empty spec
         """
+        percentFormat = FloatStringFormat.PERCENT_3_PLACES if use3Places else FloatStringFormat.PERCENT_2_PLACES
+        valueFormat   = FloatStringFormat.FLOAT_3_PLACES if use3Places else FloatStringFormat.FLOAT_2_PLACES
+        columnFormats = {Column.TABLE_HEADERS.value[Column.SYMBOL.value]         : FloatStringFormat.STRING_FORMAT,
+                         Column.OTHER_HEADERS.value[Column.GROUP.value]          : FloatStringFormat.STRING_FORMAT,
+                         Column.TABLE_HEADERS.value[Column.PERCENT_WANTED.value] : percentFormat,
+                         Column.TABLE_HEADERS.value[Column.PERCENT_ACTUAL.value] : percentFormat,
+                         Column.OTHER_HEADERS.value[Column.DRIFT.value]          : percentFormat,
+                         Column.TABLE_HEADERS.value[Column.CURRENT_VALUE.value]  : valueFormat,
+                         Column.OTHER_HEADERS.value[Column.CHANGE_VALUE.value]   : valueFormat,
+                         Column.TABLE_HEADERS.value[Column.QUANTITY.value]       : FloatStringFormat.FLOAT_3_PLACES}
         floatList = []
-        sampleRow = tableRows[-1]
-        headers   = tableRows[0]
-        # Format the sample row as a list of floats.
-        for colIndex, col in enumerate(sampleRow):
-            # Format the column as a float list.
-            if isinstance(col, str):
-                floatList.append(FloatStringFormat.STRING_FORMAT)
-            elif headers[colIndex] == Column.TABLE_HEADERS.value[Column.PERCENT_WANTED.value] or \
-                 headers[colIndex] == Column.TABLE_HEADERS.value[Column.PERCENT_ACTUAL.value]:
-                decimalFormat = FloatStringFormat.PERCENT_3_PLACES if use3Places else FloatStringFormat.PERCENT_2_PLACES
-                floatList.append(decimalFormat)
-            elif headers[colIndex] == Column.TABLE_HEADERS.value[Column.CURRENT_VALUE.value] or \
-                 headers[colIndex] == Column.OTHER_HEADERS.value[Column.CHANGE_VALUE.value]:
-                decimalFormat = FloatStringFormat.FLOAT_3_PLACES if use3Places else FloatStringFormat.FLOAT_2_PLACES
-                floatList.append(decimalFormat)
-            elif headers[colIndex] == Column.TABLE_HEADERS.value[Column.QUANTITY.value]:
-                floatList.append(FloatStringFormat.FLOAT_3_PLACES)
-            else:
+        # Look up the format of each column by its header
+        for header in tableRows[0]:
+            if header not in columnFormats:
                 raise Exception("Table value not identified for formatting")
-            
+            floatList.append(columnFormats[header])
         return floatList
     
-    def printOutput(portfolio, changes):
+    def createChangesTable(latestPrices, changes):
         """
-        @brief Prints the output to the console. This is a helper function for test and logging purposes. 
-            It takes a portfolio and a list of changes to each position
-        @param portfolio The portfolio to be printed
-        @param changes A dictionary of position symbols and the amount to change for each
+         @brief Creates the table of shares and amounts to buy of each position.
+         @param latestPrices A dictionary of the latest price of each symbol
+         @param changes A dictionary of position symbols and the amount to change for each
+         @return List of lists that represent the table, headers first
         """
         tableRows = []
         columns   = [Column.SYMBOL.value, Column.QUANTITY.value, Column.CHANGE_VALUE.value]
@@ -163,17 +167,47 @@ class Table:
                      Column.OTHER_HEADERS.value[columns[2]]]
           
         tableRows.append(headers)
-        # Prints the changes to the console.
+        # Add a row with the shares and amount to buy of each symbol.
         for symbol, valueToAdd in changes.items():
-            quantityToAdd = valueToAdd / portfolio.latestPrices[symbol]
+            price = latestPrices[symbol]
+            quantityToAdd = valueToAdd / price if price else 0
             row = [symbol, quantityToAdd, valueToAdd]
             tableRows.append(row)
+        return tableRows
+    
+    def createGroupTable(groupSummary):
+        """
+         @brief Creates the table of desired and actual weights of each group.
+         @param groupSummary A list of (group name, desired weight, actual weight, drift, current value) tuples, as returned by
+            Portfolio.getGroupSummary
+         @return List of lists that represent the table, headers first
+        """
+        tableRows = [[Column.OTHER_HEADERS.value[Column.GROUP.value],
+                      Column.TABLE_HEADERS.value[Column.PERCENT_WANTED.value],
+                      Column.TABLE_HEADERS.value[Column.PERCENT_ACTUAL.value],
+                      Column.OTHER_HEADERS.value[Column.DRIFT.value],
+                      Column.TABLE_HEADERS.value[Column.CURRENT_VALUE.value]]]
+        # One row per group, each followed by its subgroups
+        for row in groupSummary:
+            tableRows.append(list(row))
+        return tableRows
+    
+    def printOutput(portfolio, changes, saveToFile = True):
+        """
+        @brief Prints the output to the console. This is a helper function for test and logging purposes. 
+            It takes a portfolio and a list of changes to each position
+        @param portfolio The portfolio to be printed
+        @param changes A dictionary of position symbols and the amount to change for each
+        @param saveToFile Boolean to also write the table to its output file (default = True)
+        """
+        tableRows = Table.createChangesTable(portfolio.latestPrices, changes)
         tableName = TableNames.BUY_AMOUNTS
         print(f"\n{tableName}:\n")
-        table = Table.createTable(tableRows, use3Places = True)
-        tableToFile = Table.createTable(tableRows, useForFile = True, use3Places = True)
-        print(table)
-        printTableToFile(tableToFile, tableName)
+        renderedTable = Table.renderTable(tableRows, use3Places = True)
+        print(renderedTable.toFancyGrid())
+        # Write the file version of the table from the same formatted cells
+        if saveToFile:
+            printTableToFile(renderedTable.toPipe(), tableName)
          
 def printPortfolioTable(portfolio, title, columns = None):
     """
@@ -183,7 +217,21 @@ def printPortfolioTable(portfolio, title, columns = None):
      @param columns A list of column names to print. MUST be Column Enums (default = None)
     """
     print(f"\n{title}:\n")
-    portfolio.printPositions(columns)
-    portfolio.printPositionsToFile(title, columns)
+    renderedTable = portfolio.renderPositions(columns)
+    print(renderedTable.toFancyGrid())
+    printTableToFile(renderedTable.toPipe(), title)
+    print()
+
+def printGroupTable(portfolio, title):
+    """
+     @brief Prints the table of groups of a portfolio to the console and its output file. Prints nothing for a portfolio without groups
+     @param portfolio The portfolio to print the groups for
+     @param title The title of the table ( for example " Current Groups " )
+    """
+    if not getattr(portfolio, "weightTree", None):
+        return
+    renderedTable = Table.renderTable(Table.createGroupTable(portfolio.getGroupSummary()))
+    print(f"\n{title}:\n")
+    print(renderedTable.toFancyGrid())
+    printTableToFile(renderedTable.toPipe(), title)
     print()
-    
\ No newline at end of file
@@ -0,0 +1,79 @@
+class RenderedTable:
+    # Box drawing characters of the console view, as (left, fill, join, right)
+    FANCY_TOP    = ("╒", "═", "╤", "╕")
+    FANCY_HEADER = ("╞", "═", "╪", "╡")
+    FANCY_ROW    = ("├", "─", "┼", "┤")
+    FANCY_BOTTOM = ("╘", "═", "╧", "╛")
+    FANCY_BAR    = "│"
+    # Headers are kept at least this much wider than their text
+    HEADER_PADDING = 2
+
+    def __init__(self, tableRows, columnFormats):
+        """
+         @brief Format every cell of a table once. Each column is formatted in one pass with its own format and padded to the
+            width of its widest cell, so the console and file views are only a matter of joining the padded cells
+         @param tableRows The rows of the table, headers first. Must be a list of lists
+         @param columnFormats A format spec per column. An empty spec keeps the cell as text and aligns it left, any other spec is
+            applied with format() and the column is aligned right
+        """
+        headers = [str(header) for header in tableRows[0]]
+        rows    = tableRows[1:]
+        self.widths  = []
+        self.columns = []
+        self.headers = []
+        self.rightAligned = []
+
+        # Format, measure and pad one column at a time
+        for colIndex, header in enumerate(headers):
+            columnFormat = columnFormats[colIndex]
+            if columnFormat:
+                cells = [format(row[colIndex], columnFormat) for row in rows]
+            else:
+                cells = [str(row[colIndex]) for row in rows]
+            width = max(len(header) + RenderedTable.HEADER_PADDING, max(map(len, cells), default = 0))
+            # Numbers line up on the right, but a table without rows has nothing to line up
+            rightAligned = bool(columnFormat) and bool(rows)
+            pad = str.rjust if rightAligned else str.ljust
+            self.widths.append(width)
+            self.headers.append(pad(header, width))
+            self.columns.append([pad(cell, width) for cell in cells])
+            self.rightAligned.append(rightAligned)
+        self.rowCount = len(rows)
+
+    def toFancyGrid(self):
+        """
+         @brief Build the console view of the table, in the layout of tabulate's "fancy_grid".
+         @return The table as a string
+        """
+        bar   = f" {RenderedTable.FANCY_BAR} "
+        lines = [self._getRule(RenderedTable.FANCY_TOP),
+                 f"{RenderedTable.FANCY_BAR} {bar.join(self.headers)} {RenderedTable.FANCY_BAR}",
+                 self._getRule(RenderedTable.FANCY_HEADER)]
+        rowRule = self._getRule(RenderedTable.FANCY_ROW)
+        # Every row is followed by a rule, except the last which is followed by the bottom of the box
+        for rowIndex, cells in enumerate(zip(*self.columns)):
+            if rowIndex:
+                lines.append(rowRule)
+            lines.append(f"{RenderedTable.FANCY_BAR} {bar.join(cells)} {RenderedTable.FANCY_BAR}")
+        lines.append(self._getRule(RenderedTable.FANCY_BOTTOM))
+        return "\n".join(lines)
+
+    def toPipe(self):
+        """
+         @brief Build the file view of the table as a markdown table, in the layout of tabulate's "pipe".
+         @return The table as a string
+        """
+        alignments = [("-" * (width + 1) + ":") if rightAligned else ((":" if self.rowCount else "-") + "-" * (width + 1))
+                      for width, rightAligned in zip(self.widths, self.rightAligned)]
+        lines = [f"| {' | '.join(self.headers)} |", f"|{'|'.join(alignments)}|"]
+        lines.extend(f"| {' | '.join(cells)} |" for cells in zip(*self.columns))
+        return "\n".join(lines)
+
+    def _getRule(self, characters):
+        """
+         @brief Build a horizontal rule of the console view.
+         @param characters Tuple of the left, fill, join and right characters of the rule
+         @return The rule as a string
+        """
+        left, fill, join, right = characters
+        return left + join.join(fill * (width + 2) for width in self.widths) + right
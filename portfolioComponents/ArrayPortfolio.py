@@ -0,0 +1,273 @@
+import copy
+import numpy as np
+from portfolioComponents.Position import Position
+from outputFormatting.Table import Table
+from utilities.saveData import printTableToFile
+from utilities.centArithmetic import fromCents, settleCents
+
+_WINDOW_SIZE = 256
+_MIN_KEEP    = 1e-12
+
+class ArrayPortfolio:
+    def __init__(self, symbols, percentWanted, quantityShares, prices, ignore = None):
+        """
+         @brief Initializes the portfolio from contiguous arrays. Gives the same results as Portfolio with every step
+            computed as a NumPy kernel instead of a Python loop over Position objects
+         @param symbols Sequence of stock symbols
+         @param percentWanted Sequence of desired weights in the range [0, 1]
+         @param quantityShares Sequence of share quantities
+         @param prices Sequence of the latest price of each symbol
+         @param ignore Sequence of booleans, True for positions left out of calculations (default = None, meaning none)
+        """
+        self.symbols        = list(symbols)
+        self.symbolIndex    = {symbol : i for i, symbol in enumerate(self.symbols)}
+        self.percentWanted  = np.asarray(percentWanted, dtype = np.float64)
+        self.quantityShares = np.asarray(quantityShares, dtype = np.float64)
+        self.prices         = np.asarray(prices, dtype = np.float64)
+        self.ignore         = np.zeros(len(self.symbols), dtype = bool) if ignore is None else np.asarray(ignore, dtype = bool)
+        self.currentValue   = self.prices * self.quantityShares
+        self.balance        = float(self.currentValue.sum())
+        self.changes        = np.zeros(len(self.symbols))
+        self.changeCents    = np.zeros(len(self.symbols), dtype = np.int64)
+        self.calculatePercentages()
+
+    @classmethod
+    def fromPortfolio(cls, portfolio):
+        """
+         @brief Create an array portfolio from the positions and prices of an existing Portfolio.
+         @param portfolio The Portfolio to copy
+         @return A new ArrayPortfolio
+        """
+        # The arrays only hold flat weights, which would lose the top-down split between groups
+        if getattr(portfolio, "weightTree", None):
+            raise Exception("Grouped target weights are only supported by the object engine")
+        positions = portfolio.positions
+        return cls([pos.symbol for pos in positions],
+                   [pos.percentWanted for pos in positions],
+                   [pos.quantityShares for pos in positions],
+                   [portfolio.latestPrices[pos.symbol] for pos in positions],
+                   [pos.ignore for pos in positions])
+
+    @property
+    def latestPrices(self):
+        """
+         @brief The latest prices as a dictionary, for code written against Portfolio.
+         @return A dictionary of prices keyed by symbol
+        """
+        return dict(zip(self.symbols, self.prices.tolist()))
+
+    @property
+    def positionChanges(self):
+        """
+         @brief The pending changes as a dictionary, for code written against Portfolio.
+         @return A dictionary of symbols to the amount to buy
+        """
+        return dict(zip(self.symbols, self.changes.tolist()))
+
+    def calculatePercentages(self):
+        """
+         @brief Calculate the actual weight of every position.
+        """
+        self.actualPercent = self.currentValue / self.balance if self.balance else np.zeros(len(self.symbols))
+
+    def findPercentDiff(self):
+        """
+         @brief Finds the difference between the desired percentages and the actual percentages.
+         @return Array of desired minus actual weight, in symbol order
+        """
+        return self.percentWanted - self.actualPercent
+
+    def _getPercentagesToChange(self):
+        """
+         @brief Share of the total positive drift held by each position.
+         @return Array of each underweight position's share of the positive drift, 0 for positions at or above target
+        """
+        diff = self.findPercentDiff()
+        positive = diff > 0
+        perSum = diff[positive].sum()
+        percentagesToChange = np.zeros(len(self.symbols))
+        if perSum > 0:
+            percentagesToChange[positive] = diff[positive] / perSum
+        return percentagesToChange
+
+    def calcDistribution(self, value):
+        """
+         @brief Calculates the distribution of a contribution, matching Portfolio.calcDistribution. Underweight positions are
+            visited in order and each takes its share of what remains, capped at its target. Which positions are capped is
+            guessed from the amount remaining at the start of a window, the remaining amount before every position in the window
+            is then solved in closed form, and the scan only restarts at the first position whose guess was wrong.
+            The amounts are settled in whole cents in changeCents, each within a cent of its calculated amount
+         @param value The amount to distribute
+        """
+        percentToAdd = self._getPercentagesToChange()
+        gapToTarget  = self.balance * self.percentWanted - self.currentValue
+        visit        = np.flatnonzero((percentToAdd > 0) & ~self.ignore)
+        changes      = np.zeros(len(self.symbols))
+        remain       = float(value)
+        start        = 0
+        windowSize   = _WINDOW_SIZE
+
+        # Walk the underweight positions one window at a time
+        while start < len(visit):
+            window = visit[start:start + windowSize]
+            shares = percentToAdd[window]
+            gaps   = gapToTarget[window]
+            # A position is capped when its share would take it past its target
+            capped = shares * remain + self.currentValue[window] > self.percentWanted[window] * (self.balance + remain)
+            # Each position multiplies the remaining amount by keep and then subtracts spent
+            keep  = np.where(capped, 1.0, 1 - shares)
+            spent = np.where(capped, gaps, 0.0)
+            keepAfter = np.cumprod(keep)
+            # Stop the window where the running product gets too small to divide by
+            tooSmall = np.flatnonzero(keepAfter < _MIN_KEEP)
+            if len(tooSmall):
+                window, shares, gaps, capped = window[:tooSmall[0] + 1], shares[:tooSmall[0] + 1], gaps[:tooSmall[0] + 1], capped[:tooSmall[0] + 1]
+                keepAfter, spent = keepAfter[:tooSmall[0] + 1], spent[:tooSmall[0] + 1]
+            keepBefore = np.concatenate(([1.0], keepAfter[:-1]))
+            spentBefore = np.concatenate(([0.0], np.cumsum(spent[:-1] / keepAfter[:-1])))
+            remainBefore = keepBefore * (remain - spentBefore)
+
+            # The guesses hold up to the first position that is capped differently with its actual remaining amount
+            actual = shares * remainBefore + self.currentValue[window] > \
+                     self.percentWanted[window] * (self.balance + remainBefore)
+            wrong = np.flatnonzero(actual != capped)
+            runLength = wrong[0] + 1 if len(wrong) else len(window)
+            steps = np.where(actual[:runLength], gaps[:runLength], shares[:runLength] * remainBefore[:runLength])
+
+            changes[window[:runLength]] = steps
+            remain = float(remainBefore[runLength - 1] - steps[-1])
+            # Calculation error in amount remaining upon distribution
+            if remain < -0.05 or remainBefore[:runLength].min() < -0.05:
+                raise Exception("Calculation error in amount remaining upon distribution")
+            # Grow the window while the guesses keep holding
+            windowSize = windowSize * 2 if runLength == len(window) else _WINDOW_SIZE
+            start += runLength
+
+        # Spread what is left by desired weight over the positions that are not ignored.
+        if remain > 0:
+            changes += np.where(self.ignore, 0, remain * self.percentWanted)
+        # Settle the amounts in whole cents, moving each by less than a cent
+        self.changeCents = settleCents(np.where(self.ignore, 0, changes))
+        self.changes = fromCents(self.changeCents)
+
+    def sweepDistribution(self, amounts):
+        """
+         @brief Calculate the distribution of many contributions at once without changing the portfolio. Gives the same result
+            per amount as calcDistribution. The positions are walked once and every step is evaluated for all amounts together
+         @param amounts Sequence of amounts to distribute
+         @return Array of shape (amounts, symbols) with the amount bought of each symbol for each contribution, in whole cents
+        """
+        remain = np.array(amounts, dtype = np.float64)
+        percentToAdd = self._getPercentagesToChange()
+        gapToTarget  = self.balance * self.percentWanted - self.currentValue
+        allocations  = np.zeros((len(remain), len(self.symbols)))
+
+        # Each underweight position takes its share of what remains for every amount, capped at its target
+        for i in np.flatnonzero((percentToAdd > 0) & ~self.ignore):
+            share = percentToAdd[i]
+            capped = share * remain + self.currentValue[i] > self.percentWanted[i] * (self.balance + remain)
+            step = np.where(capped, gapToTarget[i], share * remain)
+            allocations[:, i] = step
+            remain -= step
+            # Calculation error in amount remaining upon distribution
+            if len(remain) and remain.min() < -0.05:
+                raise Exception("Calculation error in amount remaining upon distribution")
+
+        # Spread what is left by desired weight over the positions that are not ignored.
+        leftover = np.maximum(remain, 0)
+        allocations += np.outer(leftover, np.where(self.ignore, 0, self.percentWanted))
+        return fromCents(settleCents(np.where(self.ignore, 0, allocations)))
+
+    def previewDistribution(self, value):
+        """
+         @brief Calculate how a contribution would be distributed without applying it to the portfolio.
+         @param value The amount to contribute
+         @return A dictionary of symbols to the amount that would be bought
+        """
+        self.calcDistribution(value)
+        changes = self.positionChanges
+        self.changes = np.zeros(len(self.symbols))
+        return changes
+
+    def updatePortfolio(self):
+        """
+         @brief Apply the pending changes to the positions.
+         @return A dictionary of the changes that were applied, keyed by symbol
+        """
+        changesToPortfolio = self.positionChanges
+        self.currentValue += self.changes
+        self.balance += float(self.changes.sum())
+        self.calculatePercentages()
+        self.changes = np.zeros(len(self.symbols))
+        return changesToPortfolio
+
+    def applyPriceTicks(self, ticks):
+        """
+         @brief Apply new prices to the positions they belong to.
+         @param ticks A dictionary of new prices keyed by symbol. Symbols not in the portfolio are skipped
+         @return A list of the symbols that were updated
+        """
+        updatedSymbols = [symbol for symbol in ticks if symbol in self.symbolIndex]
+        if not updatedSymbols:
+            return updatedSymbols
+
+        index = np.fromiter((self.symbolIndex[symbol] for symbol in updatedSymbols), dtype = np.intp, count = len(updatedSymbols))
+        newValues = np.fromiter((ticks[symbol] for symbol in updatedSymbols), dtype = np.float64, count = len(updatedSymbols))
+        self.prices[index] = newValues
+        newValues *= self.quantityShares[index]
+        self.balance += float((newValues - self.currentValue[index]).sum())
+        self.currentValue[index] = newValues
+        self.calculatePercentages()
+        return updatedSymbols
+
+    def withPrices(self, ticks):
+        """
+         @brief Copy the portfolio with new prices, leaving this one untouched. The copy shares the arrays that do not depend on
+            prices, so readers of this portfolio never see a half applied update
+         @param ticks A dictionary of new prices keyed by symbol. Symbols not in the portfolio are skipped
+         @return A new ArrayPortfolio
+        """
+        updated = copy.copy(self)
+        updated.prices = self.prices.copy()
+        updated.currentValue = self.currentValue.copy()
+        updated.changes = np.zeros(len(self.symbols))
+        updated.changeCents = np.zeros(len(self.symbols), dtype = np.int64)
+        updated.applyPriceTicks(ticks)
+        return updated
+
+    def toPositions(self):
+        """
+         @brief Build Position objects for the current state, for display.
+         @return A list of Position objects in symbol order
+        """
+        positions = []
+        for i, symbol in enumerate(self.symbols):
+            position = Position([symbol, self.percentWanted[i], self.quantityShares[i], "t" if self.ignore[i] else "f"])
+            position.currentValue  = float(self.currentValue[i])
+            position.actualPercent = float(self.actualPercent[i])
+            positions.append(position)
+        return positions
+
+    def renderPositions(self, columns = None):
+        """
+         @brief Format the positions into a table once, for both the console and the file view.
+         @param columns List of columns to display. Default is all (default = None)
+         @return A RenderedTable of the positions, largest weight first
+        """
+        tableRows = Table.createOutputTable(sorted(self.toPositions(), reverse = True), columns)
+        return Table.renderTable(tableRows)
+
+    def printPositions(self, columns = None):
+        """
+         @brief Print the positions in a table.
+         @param columns List of columns to display. Default is all (default = None)
+        """
+        print(self.renderPositions(columns).toFancyGrid())
+
+    def printPositionsToFile(self, tableName, columns = None):
+        """
+         @brief Print the positions in a table to the file for tableName.
+         @param tableName Name of the table, used to create the filename
+         @param columns List of columns to display. Default is all (default = None)
+        """
+        printTableToFile(self.renderPositions(columns).toPipe(), tableName)
@@ -0,0 +1,132 @@
+import numpy as np
+from portfolioComponents.ArrayPortfolio import ArrayPortfolio
+
+class Backtest:
+    def __init__(self, dates, symbols, prices, percentWanted, quantityShares = None, ignore = None):
+        """
+         @brief Initializes a backtest of a contribution policy over historical prices.
+         @param dates Sequence of trading dates, one per row of prices
+         @param symbols Sequence of stock symbols, one per column of prices
+         @param prices 2D array of prices with shape (dates, symbols). NaN where a symbol has no price yet
+         @param percentWanted Sequence of desired weights in the range [0, 1], in symbol order
+         @param quantityShares Sequence of shares held before the first date (default = None, meaning none)
+         @param ignore Sequence of booleans, True for positions that are never bought (default = None, meaning none)
+        """
+        self.dates          = list(dates)
+        self.symbols        = list(symbols)
+        self.prices         = _forwardFill(np.asarray(prices, dtype = np.float64))
+        self.percentWanted  = np.asarray(percentWanted, dtype = np.float64)
+        self.quantityShares = np.zeros(len(self.symbols)) if quantityShares is None else np.asarray(quantityShares, dtype = np.float64)
+        self.ignore         = np.zeros(len(self.symbols), dtype = bool) if ignore is None else np.asarray(ignore, dtype = bool)
+
+    def getSchedule(self, amount, frequency = "monthly"):
+        """
+         @brief Build a contribution schedule of a fixed amount.
+         @param amount The amount contributed on each contribution date
+         @param frequency "daily", "weekly" (first trading day of each week), "monthly" (first trading day of each month),
+            or an integer number of trading days between contributions (default = "monthly")
+         @return Array of the amount contributed on each date, 0 on dates without a contribution
+        """
+        schedule = np.zeros(len(self.dates))
+        if frequency == "daily":
+            schedule[:] = amount
+        elif frequency in ("weekly", "monthly"):
+            # Contribute whenever the week or month changes from the previous date
+            periods = [(day.isocalendar()[:2] if frequency == "weekly" else (day.year, day.month)) for day in self.dates]
+            for i, period in enumerate(periods):
+                if i == 0 or period != periods[i - 1]:
+                    schedule[i] = amount
+        else:
+            schedule[::int(frequency)] = amount
+        return schedule
+
+    def run(self, schedule):
+        """
+         @brief Replay a contribution schedule with the allocation rule of Portfolio.calcDistribution. Holdings only change on
+            contribution dates, so the allocation runs once per contribution and the values, weights and drift of every date are
+            then computed as whole (dates, symbols) arrays
+         @param schedule Array of the amount contributed on each date, as returned by getSchedule
+         @return A BacktestResult
+        """
+        schedule = np.asarray(schedule, dtype = np.float64)
+        contributionDays = np.flatnonzero(schedule > 0)
+        shares = self.quantityShares.copy()
+        holdings = np.empty((len(contributionDays), len(self.symbols)))
+        invested = np.zeros(len(self.dates))
+
+        # Allocate each contribution against the prices of its date
+        for step, day in enumerate(contributionDays):
+            prices = self.prices[day]
+            missing = np.isnan(prices)
+            # Symbols without a price yet are left out like ignored positions
+            portfolio = ArrayPortfolio(self.symbols, self.percentWanted, shares, np.where(missing, 0, prices), missing | self.ignore)
+            portfolio.calcDistribution(schedule[day])
+            bought = np.divide(portfolio.changes, prices, out = np.zeros(len(self.symbols)), where = ~missing)
+            shares = shares + bought
+            holdings[step] = shares
+            invested[day] = portfolio.changes.sum()
+
+        # Shares held on every date are those after the latest contribution on or before it
+        latest = np.searchsorted(contributionDays, np.arange(len(self.dates)), side = "right") - 1
+        sharesByDate = np.where((latest >= 0)[:, None], holdings[np.maximum(latest, 0)] if len(holdings) else 0, self.quantityShares)
+        values = sharesByDate * np.nan_to_num(self.prices)
+        return BacktestResult(self, schedule, invested, values)
+
+class BacktestResult:
+    def __init__(self, backtest, contributions, invested, values):
+        """
+         @brief Holds the outcome of a backtest and derives its tracking statistics.
+         @param backtest The Backtest that was run
+         @param contributions Array of the amount contributed on each date
+         @param invested Array of the amount invested on each date
+         @param values 2D array of position values with shape (dates, symbols)
+        """
+        self.dates         = backtest.dates
+        self.symbols       = backtest.symbols
+        self.contributions = contributions
+        self.invested      = invested
+        self.values        = values
+        self.balance       = values.sum(axis = 1)
+        self.weights       = np.divide(values, self.balance[:, None], out = np.zeros_like(values), where = self.balance[:, None] > 0)
+        self.drift         = self.weights - backtest.percentWanted
+        self.trackingError = np.sqrt((self.drift ** 2).sum(axis = 1))
+
+    def getSummary(self):
+        """
+         @brief Summarize the backtest.
+         @return A dictionary of the headline statistics of the run
+        """
+        return {"startDate"          : str(self.dates[0]),
+                "endDate"            : str(self.dates[-1]),
+                "contributions"      : int((self.contributions > 0).sum()),
+                "totalContributed"   : float(self.contributions.sum()),
+                "totalInvested"      : float(self.invested.sum()),
+                "uninvestedCash"     : float(self.contributions.sum() - self.invested.sum()),
+                "finalValue"         : float(self.balance[-1]),
+                "meanTrackingError"  : float(self.trackingError.mean()),
+                "maxTrackingError"   : float(self.trackingError.max()),
+                "finalTrackingError" : float(self.trackingError[-1])}
+
+    def getSymbolDrift(self):
+        """
+         @brief Summarize the drift of each symbol from its target over the whole run.
+         @return A dictionary of symbol to its mean absolute and maximum absolute drift
+        """
+        meanDrift = np.abs(self.drift).mean(axis = 0)
+        maxDrift  = np.abs(self.drift).max(axis = 0)
+        return {symbol : {"meanAbsDrift" : float(meanDrift[i]), "maxAbsDrift" : float(maxDrift[i])}
+                for i, symbol in enumerate(self.symbols)}
+
+def _forwardFill(prices):
+    """
+     @brief Carry each symbol's last known price forward over gaps. Leading gaps stay NaN
+     @param prices 2D array of prices with shape (dates, symbols)
+     @return A new array with the gaps filled
+    """
+    valid = ~np.isnan(prices)
+    lastValid = np.where(valid, np.arange(len(prices))[:, None], 0)
+    np.maximum.accumulate(lastValid, axis = 0, out = lastValid)
+    filled = prices[lastValid, np.arange(prices.shape[1])]
+    # Dates before a symbol's first price have nothing to carry forward
+    filled[~np.maximum.accumulate(valid, axis = 0)] = np.nan
+    return filled
@@ -1,21 +1,31 @@
-from copy import deepcopy
 import traceback
+from types import MappingProxyType
 from outputFormatting.Table import Table
+from portfolioComponents.WholeShareAllocator import WholeShareAllocator
+from portfolioComponents.WeightTree import WeightTree
 from utilities.fetchStock import StockTickerData, fetchLatestPrices
 from utilities.saveData import printTableToFile
+from utilities.centArithmetic import fromCents, settleCents
 
 class Portfolio:
-    def __init__(self, positions):
+    def __init__(self, positions, quoteCache = None, priceProvider = None):
         """
          @brief Initializes the class by populating the list of positions to be used in the calculation. 
             This is the first step in the calculation of percentages.
          @param positions A list of positions that will be used in the calculation
+         @param quoteCache Optional QuoteCache to serve prices from before going to the network (default = None)
+         @param priceProvider Optional PriceProvider to fetch prices from. yfinance is used when not given (default = None)
         """
         self.positions = positions
+        self.initPositionIndex()
         self.initDesiredPercentages()
         self.tickerData = StockTickerData()
+        self.quoteCache = quoteCache
+        self.priceProvider = priceProvider
         self.getCurrentPrices()
         self.balance = self.getPositionSum()
+        # Grouped targets keep running group aggregates next to the positions
+        self.weightTree = WeightTree(self.positions) if any(pos.group for pos in self.positions) else None
         self.initPositionChanges()
         self.percentageDistribution = {}
         self.calculatePercentages()
@@ -29,33 +39,117 @@ class Portfolio:
         for position in self.positions:
             symbols.append(position.symbol)
         
+        self.latestPrices = {}
         try:
-            self.latestPrices = fetchLatestPrices([position.symbol for position in self.positions], self.tickerData)
+            self.latestPrices = fetchLatestPrices(symbols, self.tickerData, self.quoteCache, self.priceProvider)
         except Exception:
             print("Could not fetch market data.")
             traceback.print_exc()
+        # Without a single price there is nothing to calculate with
+        if self.positions and not self.latestPrices:
+            raise Exception(f"Could not fetch any prices for the {len(self.positions)} positions of the portfolio")
         
         # Set current value of the current price of all the positions
         for position in self.positions:
+            # Positions without a price are left out of the calculations instead of failing the whole portfolio
+            if position.symbol not in self.latestPrices:
+                print(f"No price for {position.symbol}, ignoring it in calculations")
+                self.latestPrices[position.symbol] = 0
+                position.ignore = True
             position.currentValue = self.latestPrices[position.symbol] * position.quantityShares
     
+    def applyPriceTicks(self, ticks):
+        """
+         @brief Apply new prices to the positions they belong to without fetching prices again. Only the ticked positions and the
+            running balance are updated. Every weight depends on the balance, so the weights are marked stale and recalculated
+            the next time they are read
+         @param ticks A dictionary of new prices keyed by symbol. Symbols not in the portfolio are skipped
+         @return A list of the symbols that were updated
+        """
+        updatedSymbols = []
+        # Move the balance by the change in value of each ticked position
+        for symbol, price in ticks.items():
+            if symbol not in self.latestPrices:
+                continue
+            position = self.getPositionBySymbol(symbol)
+            newValue = price * position.quantityShares
+            self.balance += newValue - position.currentValue
+            if self.weightTree:
+                self.weightTree.addValue(symbol, newValue - position.currentValue)
+            position.currentValue = newValue
+            self.latestPrices[symbol] = price
+            updatedSymbols.append(symbol)
+        
+        # Weights only move when a price did
+        if updatedSymbols:
+            self.percentagesStale = True
+        return updatedSymbols
+    
+    def calcWholeShareDistribution(self, value, lotSizes = None, defaultLotSize = 1):
+        """
+         @brief Calculates the distribution of a contribution in whole lots of shares. The fractional distribution from
+            calcDistribution is rounded down to whole lots and the leftover cash is spent by WholeShareAllocator on the lots that
+            bring the portfolio closest to its desired percentages. The dollar cost of the lots is stored in positionChanges
+         @param value The amount available to contribute
+         @param lotSizes A dictionary of the number of shares in one lot of a symbol (default = None, meaning defaultLotSize)
+         @param defaultLotSize Number of shares in one lot of symbols not in lotSizes (default = 1)
+         @return A dictionary of symbols to the number of shares to buy
+        """
+        self.calcDistribution(value)
+        plannedAmounts = {}
+        currentValues  = {}
+        targetValues   = {}
+        # Only positions that are not ignored and have a price can be bought
+        for symbol, position in self.positionIndex.items():
+            if position.ignore or not self.latestPrices[symbol]:
+                continue
+            plannedAmounts[symbol] = self.positionChanges[symbol]
+            currentValues[symbol]  = position.currentValue
+            targetValues[symbol]   = self.desiredPercentages[symbol] * (self.balance + value)
+        
+        allocator = WholeShareAllocator(self.latestPrices, lotSizes, defaultLotSize)
+        sharesToBuy, self.uninvestedCash = allocator.allocate(currentValues, targetValues, plannedAmounts, value)
+        # Replace the fractional amounts with the cost of the whole lots
+        for symbol in self.positionChanges:
+            self.positionChanges[symbol] = sharesToBuy.get(symbol, 0) * self.latestPrices[symbol]
+        return sharesToBuy
+    
+    def previewDistribution(self, value):
+        """
+         @brief Calculate how a contribution would be distributed without applying it to the portfolio.
+         @param value The amount to contribute
+         @return A dictionary of symbols to the amount that would be bought
+        """
+        self.initPositionChanges()
+        self.calcDistribution(value)
+        changes = self.positionChanges
+        self.initPositionChanges()
+        return changes
+    
     def updatePortfolio(self):
         """
          @brief Update the portfolio based on the changes made. 
             This is called by the position changes and should not be called directly by the user.
-         @return A dictionary of position changes that need to be applied to the portfolio in order to get the portfolio up to date
+            Only positions with a change are touched and the balance moves by the total change. The weights are marked stale
+            and recalculated the next time they are read
+         @return A read only view of the position changes that were applied to the portfolio
         """
         changeSum = 0
+        changed   = False
         
-        # Add the current value and change sum of the position changes for each symbol.
+        # Add the current value and change sum of the position changes for each symbol that changed.
         for symbol, posChange in self.positionChanges.items():
-            position = self.getPositionBySymbol(symbol)
-            position.currentValue += posChange
-            changeSum += posChange
+            if posChange:
+                self.positionIndex[symbol].currentValue += posChange
+                changeSum += posChange
+                if self.weightTree:
+                    self.weightTree.addValue(symbol, posChange)
+                changed = True
         
-        self.balance += changeSum
-        self.calculatePercentages()
-        changesToPortfolio = deepcopy(self.positionChanges)
+        if changed:
+            self.balance += changeSum
+            self.percentagesStale = True
+        changesToPortfolio = MappingProxyType(self.positionChanges)
         self.initPositionChanges()
         return changesToPortfolio    
         
@@ -64,10 +158,7 @@ class Portfolio:
          @brief Initialize self.positionChanges to a dictionary mapping symbols to 0. This is used to avoid recomputing 
             the values when a position is changed
         """
-        self.positionChanges = {}
-        # Reset the position changes for each position.
-        for position in self.positions:
-            self.positionChanges[position.symbol] = 0
+        self.positionChanges = dict.fromkeys(self.positionIndex, 0)
     
     def getPositionSum(self):
         """
@@ -80,6 +171,54 @@ class Portfolio:
             res += pos.currentValue
         return res
     
+    def initPositionIndex(self):
+        """
+         @brief Initialize the dictionary that maps symbols to their Position so lookups by symbol take constant time
+        """
+        self.positionIndex = {}
+        # Index each position by its symbol
+        for pos in self.positions:
+            self.positionIndex[pos.symbol] = pos
+    
+    def addPosition(self, position):
+        """
+         @brief Add a position to the portfolio, keeping the symbol index, weights and balance consistent.
+         @param position The Position to add. Its current value is taken from the latest price if one is known
+        """
+        if position.symbol in self.positionIndex:
+            raise Exception(f"Position '{position.symbol}' already in portfolio")
+        
+        # Value the position from the price already fetched for its symbol
+        if position.symbol in self.latestPrices:
+            position.currentValue = self.latestPrices[position.symbol] * position.quantityShares
+        self.positions.append(position)
+        self.positionIndex[position.symbol] = position
+        self.desiredPercentages[position.symbol] = position.percentWanted
+        self.positionChanges[position.symbol] = 0
+        self.balance += position.currentValue
+        if self.weightTree:
+            self.weightTree.addPosition(position)
+        self.percentagesStale = True
+    
+    def removePosition(self, symbol):
+        """
+         @brief Remove a position from the portfolio, keeping the symbol index, weights and balance consistent.
+         @param symbol The symbol of the position to remove
+         @return The removed Position
+        """
+        position = self.getPositionBySymbol(symbol)
+        self.positions.remove(position)
+        del self.positionIndex[symbol]
+        del self.desiredPercentages[symbol]
+        del self.positionChanges[symbol]
+        self.percentageDistribution.pop(symbol, None)
+        self.balance -= position.currentValue
+        if self.weightTree:
+            self.weightTree.removePosition(position)
+        # Weights of the remaining positions depend on the new balance
+        self.percentagesStale = True
+        return position
+    
     def initDesiredPercentages(self):
         """
          @brief Initialize the dictionary that maps symbols to percentWanted. This is used to determine the percentage 
@@ -96,23 +235,38 @@ class Portfolio:
         """
         # Calculates the percentage of the current value and percentage distribution for each position.
         for pos in self.positions:
-            pos.actualPercent = pos.currentValue / self.balance
+            pos.actualPercent = pos.currentValue / self.balance if self.balance else 0
             self.percentageDistribution[pos.symbol] = pos.actualPercent
+        self.percentagesStale = False
+    
+    def refreshPercentages(self):
+        """
+         @brief Recalculate the percentages if a change to the portfolio has made them stale. Called before the weights are read
+        """
+        if self.percentagesStale and self.balance:
+            self.calculatePercentages()
     
     def calcDistribution(self, value):
         """
-         @brief Calculates the distribution of positions based on the current value. This is called by the update () method to update the position changes
+         @brief Calculates the distribution of positions based on the current value. This is called by the update () method to update the position changes.
+            Every symbol is visited a constant number of times, so the pass is linear in the number of positions.
+            Grouped portfolios are distributed top-down through the weight tree instead. Either way the amounts are settled in whole
+            cents, each within a cent of its calculated amount
          @param value the value we want to
         """
+        if self.weightTree:
+            self.positionChanges = self.weightTree.allocate(value, self.positionIndex)
+            return
+        
         remain = value
         positionsUnderDesired = self._getPercentagesToChange()
         # Calculate the amount of remaining values for a given symbol.
         for symbol, percentToAdd in positionsUnderDesired.items():
-            if self.getPositionBySymbol(symbol).ignore:
+            position = self.positionIndex[symbol]
+            if position.ignore:
                 continue
             tempVal = percentToAdd * remain
-            currentPositionValue = self.getPositionBySymbol(symbol).currentValue
-            updatedValue = tempVal + currentPositionValue
+            updatedValue = tempVal + position.currentValue
             # If the value of the symbol is bigger than the desiredPercentages symbol then the value is added to the desiredPercentages.
             if updatedValue > self.desiredPercentages[symbol] * (self.balance + remain): # value > percentWanted
                 actualValueToAdd = self._calcValueToAdd(symbol)
@@ -126,16 +280,15 @@ class Portfolio:
         
         # Add the remaining percentages to the position changes.
         if remain > 0:
-            amountsToAdd = {}
-            # Adds a percentage to the amount of percentages to add to the positionChanges.
+            # Spread what is left by desired weight over the positions that are not ignored.
             for symbol, percent in self.desiredPercentages.items():
-                # Add symbol to amountsToAdd.
-                if symbol not in amountsToAdd.keys():
-                    amountsToAdd[symbol] = 0
-                    if self.getPositionBySymbol(symbol).ignore:
-                        continue
-                amountsToAdd[symbol] += remain * percent
-                self.positionChanges[symbol] += amountsToAdd[symbol]
+                if self.positionIndex[symbol].ignore:
+                    continue
+                self.positionChanges[symbol] += remain * percent
+        
+        # Settle the amounts in whole cents, moving each by less than a cent
+        changeCents = settleCents(list(self.positionChanges.values()))
+        self.positionChanges = dict(zip(self.positionChanges, fromCents(changeCents).tolist()))
                 
     def _calcValueToAdd(self, symbol):
         """
@@ -143,7 +296,7 @@ class Portfolio:
          @param symbol The symbol to calculate the value for
          @return The value to add to the balance as a float
         """
-        return self.balance * self.desiredPercentages[symbol] - self.getPositionBySymbol(symbol).currentValue
+        return self.balance * self.desiredPercentages[symbol] - self.positionIndex[symbol].currentValue
         
     def _getPercentagesToChange(self):
         """
@@ -164,18 +317,26 @@ class Portfolio:
                 percentagesToChange[symbol] = diff / perSum
         return percentagesToChange
     
+    def getGroupSummary(self):
+        """
+         @brief Read the desired and actual weight, drift and value of every group from the running group aggregates.
+         @return A list of (group name, desired weight, actual weight, drift, current value) tuples, empty if the portfolio has no groups
+        """
+        if not self.weightTree:
+            return []
+        return self.weightTree.getGroupSummary(self.balance)
+    
     def getPositionBySymbol(self, symbol):
         """
          @brief Returns position by symbol. Throws exception if position not found.
          @param symbol symbol of position to look for
          @return Position object found in the portfolio (exception will be raised in case of position not existing)
         """
-        # Returns the position of the symbol in the position list.
-        for pos in self.positions:
-            # Returns the position of the current position.
-            if pos.symbol == symbol:
-                return pos
-        raise Exception(f"Position '{symbol}' not found in portfolio")
+        # Returns the position of the symbol from the symbol index.
+        try:
+            return self.positionIndex[symbol]
+        except KeyError:
+            raise Exception(f"Position '{symbol}' not found in portfolio")
         
     # Get DesiredPercent - Actual Percent    
     def findPercentDiff(self):
@@ -184,20 +345,29 @@ class Portfolio:
          @return A dictionary with the difference between the desired percentages and the percentage distribution. 
             Keys are the symbols and values are the percent
         """
+        self.refreshPercentages()
         diff = {}
         for symbol in self.desiredPercentages.keys():
             diff[symbol] = self.desiredPercentages[symbol] - self.percentageDistribution[symbol]
         return diff
     
-    def printPositions(self, columns = None):
+    def renderPositions(self, columns = None):
         """
-         @brief Print the positions of the postitions in a table.
+         @brief Sort the positions and format them into a table once, for both the console and the file view.
          @param columns List of columns to display. Default is all (default = None)
+         @return A RenderedTable of the positions, largest weight first
         """
+        self.refreshPercentages()
         sortedPostitions = sorted(self.positions, reverse = True)
         tableRows = Table.createOutputTable(sortedPostitions, columns)
-        table = Table.createTable(tableRows)
-        print(table)
+        return Table.renderTable(tableRows)
+    
+    def printPositions(self, columns = None):
+        """
+         @brief Print the positions of the postitions in a table.
+         @param columns List of columns to display. Default is all (default = None)
+        """
+        print(self.renderPositions(columns).toFancyGrid())
     
     def printPositionsToFile(self, tableName, columns = None):
         """
@@ -205,10 +375,7 @@ class Portfolio:
          @param filename Print data to file
          @param columns List of columns to display. Default is all (default = None)
         """
-        sortedPostitions = sorted(self.positions, reverse = True)
-        tableRows = Table.createOutputTable(sortedPostitions, columns)
-        table = Table.createTable(tableRows, useForFile = True)
-        printTableToFile(table, tableName)
+        printTableToFile(self.renderPositions(columns).toPipe(), tableName)
                 
     def _toString(self, orderedList = []):
         """
@@ -217,6 +384,7 @@ class Portfolio:
          @param orderedList a list of positions to order (default = [])
          @return a string representation of the positions in the order of portfolio percentage
         """
+        self.refreshPercentages()
         positions = self.positions
         # Set positions to the list of positions
         if orderedList:
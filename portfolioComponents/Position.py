@@ -1,31 +1,61 @@
-import traceback
+from utilities.Constants import GroupConstants
 
 class Position:
+    __slots__ = ("symbol", "group", "percentWanted", "currentValue", "quantityShares", "actualPercent", "ignore")
+
     def __init__(self, row):
         """
          @brief Initializes the object with data from the CSV file. This is called by __init__ and should not be called directly
          @param row A list containing the symbol, percent wanted, current number of shares, (and optionally, [T/t] to ignore the position
-            in calculations)
-        """
-        try:
-            self.symbol = row[0]
-            self.percentWanted  = float(row[1])
-            # Ensure percentages are in range [0, 1]
-            if self.percentWanted > 1:
-                self.percentWanted /= 100
-            self.currentValue   = 0
-            self.quantityShares = float(row[2])
-            self.actualPercent  = 0
-            self.ignore         = False
-            # If the optional ignore flag is present
-            if len(row) > 3:
-                if row[3].lower() == "t":
-                    self.ignore = True
-        
-        except Exception:
-            print("An error occurred converting the raw data into Positions")
-            traceback.print_exc()
+            in calculations). The symbol may be preceded by the groups it belongs to, as in "US Equity/Large Cap/VTI".
+            Raises ValueError if the row is malformed
+        """
+        # A malformed row raises instead of leaving a half built Position
+        if len(row) < 3:
+            raise ValueError(f"expected a symbol, weight and number of shares but got {len(row)} field(s)")
+        self.symbol = row[0].strip()
+        self.group  = ()
+        # Split the groups off the front of the symbol
+        if GroupConstants.SEPARATOR in self.symbol:
+            *group, self.symbol = self.symbol.split(GroupConstants.SEPARATOR)
+            self.group  = tuple(name.strip() for name in group)
+            self.symbol = self.symbol.strip()
+        if not self.symbol:
+            raise ValueError("missing symbol")
+        self.percentWanted  = float(row[1])
+        # Ensure percentages are in range [0, 1]
+        if self.percentWanted > 1:
+            self.percentWanted /= 100
+        self.currentValue   = 0
+        self.quantityShares = float(row[2])
+        self.actualPercent  = 0
+        self.ignore         = False
+        # If the optional ignore flag is present
+        if len(row) > 3:
+            if row[3].strip().lower() == "t":
+                self.ignore = True
                 
+    @classmethod
+    def fromValues(cls, symbol, percentWanted, quantityShares, ignore = False, group = ()):
+        """
+         @brief Create a Position from values that have already been parsed, without going through a CSV row.
+         @param symbol The stock symbol
+         @param percentWanted Desired weight in the range [0, 1]
+         @param quantityShares Current number of shares
+         @param ignore True to leave the position out of calculations (default = False)
+         @param group Tuple of the groups the position belongs to (default = (), meaning none)
+         @return A new Position
+        """
+        position = cls.__new__(cls)
+        position.symbol         = symbol
+        position.group          = group
+        position.percentWanted  = percentWanted
+        position.currentValue   = 0
+        position.quantityShares = quantityShares
+        position.actualPercent  = 0
+        position.ignore         = ignore
+        return position
+
     def addValue(self, value):
         """
          @brief Adds a value to the current value.
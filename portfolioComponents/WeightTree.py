@@ -0,0 +1,207 @@
+import numpy as np
+from portfolioComponents.ArrayPortfolio import ArrayPortfolio
+from utilities.Constants import GroupConstants
+
+class WeightGroup:
+    __slots__ = ("path", "parent", "groups", "symbols", "target", "value", "activeLeaves")
+
+    def __init__(self, path, parent = None):
+        """
+         @brief One group of a weight tree, holding the aggregates of every position below it.
+         @param path Tuple of group names from the top of the tree down to this group
+         @param parent The WeightGroup this group belongs to (default = None, meaning this is the root)
+        """
+        self.path         = path
+        self.parent       = parent
+        self.groups       = []
+        self.symbols      = []
+        self.target       = 0
+        self.value        = 0
+        self.activeLeaves = 0
+
+    def getName(self):
+        """
+         @brief The full name of the group, as written in the CSV file.
+         @return The group names joined by GroupConstants.SEPARATOR
+        """
+        return GroupConstants.SEPARATOR.join(self.path)
+
+class WeightTree:
+    def __init__(self, positions):
+        """
+         @brief Build the tree of groups of a portfolio. Every group keeps the sum of the desired weights and current values of
+            the positions below it, so reading a group's drift never has to add up its positions again
+         @param positions List of Positions with their group, desired weight and current value set
+        """
+        self.root        = WeightGroup(())
+        self.groups      = {() : self.root}
+        self.symbolGroup = {}
+        # Add each position to its group and every group above it
+        for position in positions:
+            self.addPosition(position)
+
+    def addPosition(self, position):
+        """
+         @brief Add a position to its group, creating any groups that do not exist yet. O(depth)
+         @param position The Position to add
+        """
+        group = self._getGroup(position.group)
+        group.symbols.append(position.symbol)
+        self.symbolGroup[position.symbol] = group
+        self._addToAncestors(group, position.percentWanted, position.currentValue, 0 if position.ignore else 1)
+
+    def removePosition(self, position):
+        """
+         @brief Remove a position from its group. Groups left empty stay in the tree with no weight. O(depth)
+         @param position The Position to remove
+        """
+        group = self.symbolGroup.pop(position.symbol)
+        group.symbols.remove(position.symbol)
+        self._addToAncestors(group, -position.percentWanted, -position.currentValue, 0 if position.ignore else -1)
+
+    def addValue(self, symbol, delta):
+        """
+         @brief Move the value of a position's group and every group above it. O(depth)
+         @param symbol The symbol whose value changed
+         @param delta The change in value
+        """
+        group = self.symbolGroup[symbol]
+        # Walk up to the root
+        while group is not None:
+            group.value += delta
+            group = group.parent
+
+    def getGroupSummary(self, balance):
+        """
+         @brief Read the aggregates of every group, parents before their children.
+         @param balance The total value of the portfolio
+         @return A list of (group name, desired weight, actual weight, drift, current value) tuples
+        """
+        summary = []
+        stack = list(reversed(self.root.groups))
+        # Depth first so each group is followed by its subgroups
+        while stack:
+            group = stack.pop()
+            actual = group.value / balance if balance else 0
+            summary.append((group.getName(), group.target, actual, actual - group.target, group.value))
+            stack.extend(reversed(group.groups))
+        return summary
+
+    def allocate(self, value, positionIndex):
+        """
+         @brief Distribute a contribution top-down. Each level is split between the groups and positions directly below it with
+            the same rule as Portfolio.calcDistribution, using the group aggregates, so drift between groups is corrected before
+            drift inside them. Every group is split exactly once, one level at a time
+         @param value The amount to contribute
+         @param positionIndex A dictionary of symbol to Position
+         @return A dictionary of symbols to the amount to buy
+        """
+        changes = dict.fromkeys(positionIndex, 0)
+        amounts = {() : value}
+        level = [self.root]
+        # Split the amount of every group on this level, then move down to the groups below
+        while level:
+            nextLevel = []
+            for group in level:
+                amount = amounts[group.path]
+                if amount <= 0:
+                    continue
+                positions = [positionIndex[symbol] for symbol in group.symbols]
+                targets   = [child.target for child in group.groups] + [pos.percentWanted for pos in positions]
+                values    = [child.value for child in group.groups] + [pos.currentValue for pos in positions]
+                ignore    = [child.activeLeaves == 0 for child in group.groups] + [pos.ignore for pos in positions]
+                # Below the top level, weights are shares of the group
+                scale = group.target if group.parent is not None and group.target > 0 else 1
+                split = ArrayPortfolio(range(len(targets)), np.divide(targets, scale), values, np.ones(len(targets)), ignore)
+                split.calcDistribution(amount)
+
+                for i, child in enumerate(group.groups):
+                    amounts[child.path] = split.changes[i]
+                    nextLevel.append(child)
+                offset = len(group.groups)
+                for i, symbol in enumerate(group.symbols):
+                    changes[symbol] = float(split.changes[offset + i])
+            level = nextLevel
+        return changes
+
+    def _getGroup(self, path):
+        """
+         @brief Get the group at a path, creating it and any missing groups above it.
+         @param path Tuple of group names
+         @return The WeightGroup
+        """
+        if path in self.groups:
+            return self.groups[path]
+        parent = self._getGroup(path[:-1])
+        group = WeightGroup(path, parent)
+        parent.groups.append(group)
+        self.groups[path] = group
+        return group
+
+    def _addToAncestors(self, group, target, value, activeLeaves):
+        """
+         @brief Add to the aggregates of a group and every group above it.
+         @param group The lowest WeightGroup to update
+         @param target Desired weight to add
+         @param value Current value to add
+         @param activeLeaves Number of positions that are not ignored to add
+        """
+        while group is not None:
+            group.target       += target
+            group.value        += value
+            group.activeLeaves += activeLeaves
+            group = group.parent
+
+def resolveGroupWeights(positions, groupWeights):
+    """
+     @brief Turn the weights of grouped positions into weights of the whole portfolio. Top level groups and positions keep
+        their weight. Below that, a weight is a share of its group: each group's weight is split between its subgroups and
+        positions in proportion to their weights. A group without a weight of its own weighs the sum of what is in it
+     @param positions List of Positions whose percentWanted is set in place
+     @param groupWeights A dictionary of group path tuple to the weight given for that group
+    """
+    children = {() : []}
+    # Link every group to the groups and positions directly in it
+    for position in positions:
+        path = ()
+        for name in position.group:
+            parentPath, path = path, path + (name,)
+            if path not in children:
+                children[path] = []
+                children[parentPath].append(path)
+        children[path].append(position)
+
+    for path in groupWeights:
+        if path not in children:
+            raise Exception(f"Group '{GroupConstants.SEPARATOR.join(path)}' has no positions")
+
+    rawWeights = {}
+    # Hand each group's weight down to what is in it, one level at a time
+    level = [(child, _getRawWeight(child, children, groupWeights, rawWeights)) for child in children[()]]
+    while level:
+        nextLevel = []
+        for node, weight in level:
+            if not isinstance(node, tuple):
+                node.percentWanted = weight
+                continue
+            childWeights = [_getRawWeight(child, children, groupWeights, rawWeights) for child in children[node]]
+            childSum = sum(childWeights)
+            for child, childWeight in zip(children[node], childWeights):
+                nextLevel.append((child, weight * childWeight / childSum if childSum else 0))
+        level = nextLevel
+
+def _getRawWeight(node, children, groupWeights, rawWeights):
+    """
+     @brief The weight of a position or group relative to what is next to it.
+     @param node A Position, or the path tuple of a group
+     @param children A dictionary of group path to the groups and positions directly in it
+     @param groupWeights A dictionary of group path tuple to the weight given for that group
+     @param rawWeights A dictionary of the group weights worked out so far, filled in as groups are reached
+     @return The weight given in the file, or for a group without one the sum of the weights in it
+    """
+    if not isinstance(node, tuple):
+        return node.percentWanted
+    if node not in rawWeights:
+        childSum = sum(_getRawWeight(child, children, groupWeights, rawWeights) for child in children[node])
+        rawWeights[node] = groupWeights.get(node, childSum)
+    return rawWeights[node]
@@ -0,0 +1,91 @@
+import heapq
+import math
+
+_ROUNDING_TOLERANCE = 1e-9
+
+class WholeShareAllocator:
+    def __init__(self, prices, lotSizes = None, defaultLotSize = 1):
+        """
+         @brief Initializes the allocator with the prices and lot sizes to buy in.
+         @param prices A dictionary of the latest price of each symbol
+         @param lotSizes A dictionary of the number of shares in one lot of a symbol (default = None, meaning defaultLotSize)
+         @param defaultLotSize Number of shares in one lot of symbols not in lotSizes (default = 1)
+        """
+        self.prices         = prices
+        self.lotSizes       = lotSizes or {}
+        self.defaultLotSize = defaultLotSize
+
+    def allocate(self, currentValues, targetValues, plannedAmounts, cash):
+        """
+         @brief Turn planned dollar amounts into whole lots within the available cash. Every plan is rounded down to whole lots
+            first, then the leftover cash buys one lot at a time, always the lot that reduces the squared dollar drift from the
+            targets the most. A heap keyed on that reduction makes each purchase O(log n)
+         @param currentValues A dictionary of the current value of each symbol to allocate to
+         @param targetValues A dictionary of the value each symbol should have after the contribution
+         @param plannedAmounts A dictionary of the fractional dollar amount planned for each symbol
+         @param cash The amount available to spend
+         @return Tuple of a dictionary of shares to buy per symbol and the cash left over
+        """
+        sharesToBuy = {}
+        values = dict(currentValues)
+        remain = cash
+
+        # Round every plan down to whole lots
+        for symbol, planned in plannedAmounts.items():
+            lotCost = self._getLotCost(symbol)
+            lots = math.floor(max(planned, 0) / lotCost + _ROUNDING_TOLERANCE) if lotCost > 0 else 0
+            sharesToBuy[symbol] = lots * self._getLotSize(symbol)
+            values[symbol] += lots * lotCost
+            remain -= lots * lotCost
+
+        # Seed the heap with the first extra lot of every symbol
+        heap = []
+        for symbol in plannedAmounts:
+            lotCost = self._getLotCost(symbol)
+            if 0 < lotCost <= remain:
+                gain = self._getDriftReduction(values[symbol], targetValues[symbol], lotCost)
+                heap.append((-gain, symbol))
+        heapq.heapify(heap)
+
+        # Keep buying the most helpful affordable lot while it still reduces drift
+        while heap:
+            negativeGain, symbol = heapq.heappop(heap)
+            lotCost = self._getLotCost(symbol)
+            if -negativeGain <= 0:
+                break
+            # Cash only goes down, so a lot that cannot be afforded now never will be
+            if lotCost > remain:
+                continue
+            sharesToBuy[symbol] += self._getLotSize(symbol)
+            values[symbol] += lotCost
+            remain -= lotCost
+            gain = self._getDriftReduction(values[symbol], targetValues[symbol], lotCost)
+            heapq.heappush(heap, (-gain, symbol))
+
+        return sharesToBuy, remain
+
+    def _getLotSize(self, symbol):
+        """
+         @brief Number of shares in one lot of a symbol.
+         @param symbol The symbol to look up
+         @return The lot size
+        """
+        return self.lotSizes.get(symbol, self.defaultLotSize)
+
+    def _getLotCost(self, symbol):
+        """
+         @brief Price of one lot of a symbol.
+         @param symbol The symbol to look up
+         @return The lot cost, 0 if the symbol has no price
+        """
+        return self.prices.get(symbol, 0) * self._getLotSize(symbol)
+
+    def _getDriftReduction(self, value, targetValue, lotCost):
+        """
+         @brief How much buying one more lot reduces the squared dollar drift of a position.
+         @param value The current value of the position
+         @param targetValue The value the position should have
+         @param lotCost The price of one lot
+         @return (value - target)^2 - (value + lotCost - target)^2, positive when the lot helps
+        """
+        return lotCost * (2 * (targetValue - value) - lotCost)
@@ -3,19 +3,75 @@ import os
 class FileConstants:
     OUTPUT_FILE_DIR  = "outputFiles"
     ARCHIVE_FILE_DIR = "archivedFiles"
+    LOCK_FILE_DIR    = "locks"
     DIR_PATH         = os.path.dirname(os.path.dirname(os.path.realpath(__file__))) # Get root project dir
     SAVE_PATH        = os.path.join(DIR_PATH, OUTPUT_FILE_DIR)
     ALT_SAVE_PATH    = os.path.join(SAVE_PATH, ARCHIVE_FILE_DIR)
+    ARCHIVE_SHARD_FORMAT = os.path.join("%Y", "%m", "%d")
+    ARCHIVE_STAMP_FORMAT = "%H%M%S_%f"
 
 class TableNames:
     CURRENT_PORTOLIO  = "Current Portfolio"
     UPDATED_PORTFOLIO = "Updated Portfolio"
     BUY_AMOUNTS       = "Buy per Position"
+    CURRENT_GROUPS    = "Current Groups"
+    UPDATED_GROUPS    = "Updated Groups"
     
+class ReadConstants:
+    MAX_REPORTED_ROWS = 10
+
+class GroupConstants:
+    SEPARATOR = "/"
+
 class FloatStringFormat:
     FLOAT_2_PLACES   = ".2f"
     PERCENT_2_PLACES = ".2%"
     FLOAT_3_PLACES   = ".3f"
     PERCENT_3_PLACES = ".3%"
     STRING_FORMAT    = ""
-    DEFAULT_FLOAT_FORMAT  = [STRING_FORMAT, PERCENT_2_PLACES, PERCENT_2_PLACES, FLOAT_2_PLACES]
\ No newline at end of file
+    DEFAULT_FLOAT_FORMAT  = [STRING_FORMAT, PERCENT_2_PLACES, PERCENT_2_PLACES, FLOAT_2_PLACES]
+
+class CacheConstants:
+    QUOTE_CACHE_FILE     = "quoteCache.json"
+    QUOTE_CACHE_PATH     = os.path.join(FileConstants.SAVE_PATH, QUOTE_CACHE_FILE)
+    INTRADAY_TTL_SECONDS = 60
+
+class FetchConstants:
+    MAX_WORKERS       = 8
+    MAX_RETRIES       = 3
+    BACKOFF_SECONDS   = 0.5
+    TIMEOUT_SECONDS   = 10
+    BULK_PERIOD       = "5d"
+    DEFAULT_CURRENCY  = "USD"
+
+class BatchConstants:
+    OUTPUT_DIR  = "batch"
+    OUTPUT_PATH = os.path.join(FileConstants.SAVE_PATH, OUTPUT_DIR)
+    CHUNK_SIZE  = 4
+
+
+class HistoryConstants:
+    STORE_DIR       = "priceHistory"
+    STORE_PATH      = os.path.join(FileConstants.SAVE_PATH, STORE_DIR)
+    INDEX_FILE      = "index.json"
+    PRICES_FILE     = "prices.f8"
+    SYMBOL_CAPACITY = 64
+    DEFAULT_YEARS   = 20
+
+class SnapshotConstants:
+    SNAPSHOT_DIR   = "snapshots"
+    SNAPSHOT_PATH  = os.path.join(FileConstants.SAVE_PATH, SNAPSHOT_DIR)
+    META_FILE      = "meta.json"
+    HASH_CHUNK     = 1 << 20
+    FORMAT_VERSION = 1
+
+class RunHistoryConstants:
+    DB_FILE              = "runHistory.sqlite3"
+    DB_PATH              = os.path.join(FileConstants.SAVE_PATH, DB_FILE)
+    BUSY_TIMEOUT_SECONDS = 30
+
+class ServiceConstants:
+    DEFAULT_HOST       = "127.0.0.1"
+    DEFAULT_PORT       = 8765
+    MAX_BODY_BYTES     = 1 << 16
+    REQUEST_QUEUE_SIZE = 128
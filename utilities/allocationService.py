@@ -0,0 +1,232 @@
+import os
+import copy
+import json
+import math
+import signal
+import threading
+import traceback
+from time import perf_counter, sleep, time
+from urllib.parse import urlsplit, parse_qs
+from socketserver import ThreadingMixIn, UnixStreamServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from portfolioComponents.ArrayPortfolio import ArrayPortfolio
+from utilities.readData import getPortfolioFromFile
+from utilities.fetchStock import fetchLatestPrices, StockTickerData
+from utilities.Constants import ServiceConstants, SnapshotConstants
+
+class AllocationService:
+    def __init__(self, filenames, quoteCache = None, priceProvider = None, snapshotDir = SnapshotConstants.SNAPSHOT_PATH):
+        """
+         @brief Load portfolios once and keep them ready to answer allocation requests. A portfolio is never changed by a request.
+            Flat portfolios are held as ArrayPortfolios that are replaced, not changed, when prices move, and every request
+            calculates on its own shallow copy. Grouped portfolios need the object engine, whose calculation uses scratch state on
+            the portfolio, so their requests take turns on a lock and the scratch state is reset before the lock is released
+         @param filenames List of portfolio CSV files. Each portfolio is named by its filename without the extension
+         @param quoteCache Optional QuoteCache used when the portfolios are first priced (default = None)
+         @param priceProvider Optional PriceProvider to price and refresh the portfolios from. yfinance is used when not given (default = None)
+         @param snapshotDir Directory of parsed portfolio snapshots, None to always parse the files (default = SnapshotConstants.SNAPSHOT_PATH)
+        """
+        self.priceProvider = priceProvider
+        self.tickerData = StockTickerData()
+        self.portfolios = {}
+        self.locks = {}
+        self.pricesAsOf = time()
+        for filename in filenames:
+            name = os.path.splitext(os.path.basename(filename))[0]
+            portfolio = getPortfolioFromFile(filename, quoteCache, priceProvider, snapshotDir)
+            if portfolio.weightTree:
+                self.locks[name] = threading.Lock()
+                self.portfolios[name] = portfolio
+            else:
+                self.portfolios[name] = ArrayPortfolio.fromPortfolio(portfolio)
+
+    def allocate(self, name, amount):
+        """
+         @brief Calculate how a contribution to one portfolio would be bought.
+         @param name Name of the portfolio
+         @param amount The amount to contribute
+         @return A dictionary of symbols to the amount to buy, for the symbols that are bought
+        """
+        if name not in self.portfolios:
+            raise KeyError(f"Unknown portfolio {name}")
+        if name in self.locks:
+            with self.locks[name]:
+                changes = self.portfolios[name].previewDistribution(amount)
+        else:
+            # The calculation only rebinds its results, so a shallow copy keeps them away from other requests
+            request = copy.copy(self.portfolios[name])
+            request.calcDistribution(amount)
+            changes = request.positionChanges
+        return {symbol : value for symbol, value in changes.items() if value}
+
+    def getSummary(self):
+        """
+         @brief Describe the loaded portfolios.
+         @return A dictionary of portfolio names to their number of positions and balance
+        """
+        return {name : {"positions" : len(portfolio.latestPrices), "balance" : round(portfolio.balance, 2)}
+                for name, portfolio in self.portfolios.items()}
+
+    def applyPriceTicks(self, ticks):
+        """
+         @brief Move every portfolio to new prices. Flat portfolios are swapped for updated copies, so a request that is already
+            running finishes on the prices it started with
+         @param ticks A dictionary of new prices keyed by symbol
+        """
+        for name, portfolio in list(self.portfolios.items()):
+            if name in self.locks:
+                with self.locks[name]:
+                    portfolio.applyPriceTicks(ticks)
+            else:
+                self.portfolios[name] = portfolio.withPrices(ticks)
+        self.pricesAsOf = time()
+
+    def refreshPrices(self, intervalSeconds):
+        """
+         @brief Keep the prices of every portfolio up to date from the price provider. Runs until the process exits
+         @param intervalSeconds Seconds between price refreshes
+        """
+        symbols = sorted({symbol for portfolio in self.portfolios.values() for symbol in portfolio.latestPrices})
+        # The prices were fetched when the portfolios were loaded, so the first refresh waits a full interval
+        while True:
+            sleep(intervalSeconds)
+            # Only failures of this refresh are reported, a symbol that failed before may have recovered
+            self.tickerData.clearFailedSymbols()
+            try:
+                prices = fetchLatestPrices(symbols, self.tickerData, provider = self.priceProvider)
+            except Exception:
+                print("Could not fetch market data.")
+                traceback.print_exc()
+                continue
+            self.applyPriceTicks(prices)
+
+class _AllocationHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        """
+         @brief Answer GET /portfolios and GET /allocate?portfolio=P&amount=X.
+        """
+        url = urlsplit(self.path)
+        if url.path == "/portfolios":
+            self._sendJson(200, {"pricesAsOf" : self.server.service.pricesAsOf, "portfolios" : self.server.service.getSummary()})
+        elif url.path == "/allocate":
+            query = parse_qs(url.query)
+            self._allocate({key : values[0] for key, values in query.items()})
+        else:
+            self._sendJson(404, {"error" : f"Unknown path {url.path}"})
+
+    def do_POST(self):
+        """
+         @brief Answer POST /allocate with a JSON body of {"portfolio": P, "amount": X}.
+        """
+        if urlsplit(self.path).path != "/allocate":
+            self._sendJson(404, {"error" : f"Unknown path {self.path}"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > ServiceConstants.MAX_BODY_BYTES:
+            self._sendJson(413, {"error" : "Request body is too large"})
+            return
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            self._sendJson(400, {"error" : f"Invalid JSON: {e.msg}"})
+            return
+        self._allocate(request)
+
+    def _allocate(self, request):
+        """
+         @brief Calculate one allocation request and send the result.
+         @param request A dictionary with the "portfolio" name and the "amount" to contribute
+        """
+        start = perf_counter()
+        try:
+            name = request["portfolio"]
+            amount = float(request["amount"])
+        except (KeyError, TypeError, ValueError):
+            self._sendJson(400, {"error" : "Give a portfolio and a numeric amount"})
+            return
+        # NaN and infinity cannot be allocated or written as JSON, and there is nothing to allocate without a positive amount
+        if not math.isfinite(amount) or amount <= 0:
+            self._sendJson(400, {"error" : "The amount must be a finite number greater than 0"})
+            return
+        try:
+            changes = self.server.service.allocate(name, amount)
+        except KeyError as e:
+            self._sendJson(404, {"error" : e.args[0]})
+            return
+        except Exception as e:
+            traceback.print_exc()
+            self._sendJson(500, {"error" : str(e)})
+            return
+        self._sendJson(200, {"portfolio"  : name,
+                             "amount"     : amount,
+                             "invested"   : round(sum(changes.values()), 2),
+                             "changes"    : {symbol : round(value, 2) for symbol, value in changes.items()},
+                             "pricesAsOf" : self.server.service.pricesAsOf,
+                             "elapsedMs"  : round((perf_counter() - start) * 1000, 3)})
+
+    def _sendJson(self, status, body):
+        """
+         @brief Send a JSON response.
+         @param status HTTP status code
+         @param body Object to send as JSON
+        """
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        """
+         @brief Keep requests out of the log, they are too frequent to be useful there.
+        """
+
+class _TCPHTTPServer(ThreadingHTTPServer):
+    request_queue_size = ServiceConstants.REQUEST_QUEUE_SIZE
+
+class _UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = ServiceConstants.REQUEST_QUEUE_SIZE
+
+    def get_request(self):
+        """
+         @brief Accept a connection. Unix sockets have no client address, so one is made up for the handler
+        """
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+def serve(service, address = None, refreshSeconds = None):
+    """
+     @brief Serve allocation requests until interrupted.
+     @param service The AllocationService to answer from
+     @param address "host:port", ":port" or the path of a Unix socket. Listens on ServiceConstants.DEFAULT_HOST and DEFAULT_PORT
+        when None (default = None)
+     @param refreshSeconds Seconds between price refreshes. Prices are not refreshed when None (default = None)
+    """
+    address = address or f"{ServiceConstants.DEFAULT_HOST}:{ServiceConstants.DEFAULT_PORT}"
+    host, _, port = address.rpartition(":")
+    # Anything that is not a port number is taken as the path of a Unix socket
+    if port.isdigit():
+        server = _TCPHTTPServer((host or ServiceConstants.DEFAULT_HOST, int(port)), _AllocationHandler)
+    else:
+        if os.path.exists(address):
+            os.remove(address)
+        server = _UnixHTTPServer(address, _AllocationHandler)
+    server.service = service
+
+    if refreshSeconds:
+        threading.Thread(target = service.refreshPrices, args = (refreshSeconds,), daemon = True).start()
+    # A service manager stops the service with SIGTERM, which gets the same clean shutdown as Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"Serving {', '.join(service.portfolios)} on {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped serving")
+    finally:
+        server.server_close()
+        if isinstance(server, _UnixHTTPServer):
+            os.remove(address)
@@ -0,0 +1,125 @@
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from portfolioComponents.Portfolio import Portfolio
+from outputFormatting.Table import Table
+from utilities.readData import readPositionsFromFile
+from utilities.fetchStock import fetchLatestPrices, StockTickerData
+from utilities.priceProviders import StaticProvider
+from utilities.runHistory import RunHistory
+from utilities.portfolioSnapshot import PortfolioSnapshot
+from utilities.Constants import TableNames, BatchConstants, RunHistoryConstants, SnapshotConstants
+
+def getBatchJobs(path, defaultAmount = None):
+    """
+     @brief Collect the portfolio files of a batch run.
+     @param path A directory, in which case every CSV file in it is an account, or a manifest file with one
+        "path[, amount]" per line. Relative paths in a manifest are relative to the manifest
+     @param defaultAmount Amount to contribute to accounts that do not give their own (default = None)
+     @return A list of (filename, amount) tuples
+    """
+    # Every CSV file in a directory is one account
+    if os.path.isdir(path):
+        filenames = sorted(name for name in os.listdir(path) if name.lower().endswith(".csv"))
+        return [(os.path.join(path, name), defaultAmount) for name in filenames]
+
+    jobs = []
+    manifestDir = os.path.dirname(os.path.abspath(path))
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            # Skip blank lines and comments
+            if not line or line.startswith("#"):
+                continue
+            tokens = [token.strip() for token in line.split(",")]
+            amount = float(tokens[1]) if len(tokens) > 1 and tokens[1] else defaultAmount
+            jobs.append((os.path.join(manifestDir, tokens[0]), amount))
+    return jobs
+
+def runBatch(jobs, outputDir = BatchConstants.OUTPUT_PATH, quoteCache = None, priceProvider = None, workers = None,
+             historyPath = RunHistoryConstants.DB_PATH, snapshotDir = SnapshotConstants.SNAPSHOT_PATH):
+    """
+     @brief Calculate the contributions of many accounts. The union of their symbols is priced once and the accounts are
+        then calculated in parallel on a process pool, each writing its own output file
+     @param jobs A list of (filename, amount) tuples, as returned by getBatchJobs
+     @param outputDir Directory to write one markdown file per account to (default = BatchConstants.OUTPUT_PATH)
+     @param quoteCache Optional QuoteCache used for the single price fetch (default = None)
+     @param priceProvider Optional PriceProvider used for the single price fetch (default = None)
+     @param workers Number of worker processes. Uses the number of CPUs when None (default = None)
+     @param historyPath Path of the run history database to record every account in, None to not record (default = RunHistoryConstants.DB_PATH)
+     @param snapshotDir Directory of parsed portfolio snapshots, None to always parse the files (default = SnapshotConstants.SNAPSHOT_PATH)
+     @return A list of (filename, total bought, output path or error message) tuples in job order
+    """
+    accounts = []
+    symbols = {}
+    readErrors = {}
+    outputPaths = _getOutputPaths([filename for filename, _ in jobs], outputDir)
+    # Read every account first so the symbols they share are only priced once
+    for (filename, amount), outputPath in zip(jobs, outputPaths):
+        if amount is None:
+            raise Exception(f"No contribution amount given for {filename}")
+        # A file that cannot be read fails its own account, not the whole batch
+        try:
+            positions = readPositionsFromFile(filename, snapshotDir)
+        except Exception as e:
+            readErrors[filename] = f"Failed: {e}"
+            continue
+        accounts.append((filename, positions, amount, outputPath))
+        for position in positions:
+            symbols[position.symbol] = None
+
+    prices = fetchLatestPrices(list(symbols), StockTickerData(), quoteCache, priceProvider)
+    print(f"Priced {len(prices)} unique symbols for {len(accounts)} accounts")
+
+    os.makedirs(outputDir, exist_ok = True)
+    tasks = [(filename, positions, {pos.symbol : prices[pos.symbol] for pos in positions if pos.symbol in prices}, amount, outputPath,
+              historyPath)
+             for filename, positions, amount, outputPath in accounts]
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        results = iter(executor.map(_runAccount, tasks, chunksize = BatchConstants.CHUNK_SIZE))
+        # Put the accounts that could not be read back in job order
+        return [(filename, 0, readErrors[filename]) if filename in readErrors else next(results) for filename, _ in jobs]
+
+def _getOutputPaths(filenames, outputDir):
+    """
+     @brief Name the output file of every account after its portfolio file. Accounts whose files share a name, from different
+        directories or listed more than once, are numbered by their place in the batch so they do not overwrite each other
+     @param filenames The portfolio file of every account, in job order
+     @param outputDir Directory the output files are written to
+     @return A list of output paths in job order
+    """
+    names = [os.path.splitext(os.path.basename(filename))[0] for filename in filenames]
+    counts = {}
+    for name in names:
+        counts[name] = counts.get(name, 0) + 1
+    return [os.path.join(outputDir, (f"{index}-{name}" if counts[name] > 1 else name) + ".md")
+            for index, name in enumerate(names, 1)]
+
+def _runAccount(task):
+    """
+     @brief Calculate and apply one account's contribution and write its buy table and updated portfolio to a file.
+        Runs in a worker process
+     @param task Tuple of filename, positions, prices of the account's symbols, amount, output path and run history path
+     @return Tuple of filename, total bought and the output path, or the error message if the account failed
+    """
+    filename, positions, prices, amount, outputPath, historyPath = task
+    try:
+        portfolio = Portfolio(positions, priceProvider = StaticProvider(prices))
+        portfolio.calcDistribution(amount)
+        changes = portfolio.updatePortfolio()
+        # Workers record at the same time, which the write-ahead log of the history allows
+        if historyPath:
+            runHistory = RunHistory(historyPath)
+            runHistory.recordRun(portfolio, changes, amount, filename, PortfolioSnapshot().getFingerprint(filename))
+            runHistory.close()
+
+        buyTable = Table.createTable(Table.createChangesTable(portfolio.latestPrices, changes), useForFile = True, use3Places = True)
+        portfolio.refreshPercentages()
+        positionTable = Table.createTable(Table.createOutputTable(sorted(portfolio.positions, reverse = True)), useForFile = True)
+        with open(outputPath, "w") as f:
+            f.write(f"## {TableNames.BUY_AMOUNTS}\n\n{buyTable}\n\n## {TableNames.UPDATED_PORTFOLIO}\n\n{positionTable}\n")
+        return filename, sum(changes.values()), outputPath
+
+    except Exception as e:
+        traceback.print_exc()
+        return filename, 0, f"Failed: {e}"
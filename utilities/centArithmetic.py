@@ -0,0 +1,46 @@
+import numpy as np
+
+CENTS_PER_DOLLAR = 100
+# Amounts within this many cents below a whole cent are taken as that cent, so float noise is not rounded down
+_CENT_TOLERANCE  = 1e-6
+
+def toCents(amount):
+    """
+     @brief Convert dollar amounts to whole cents.
+     @param amount A dollar amount or array of dollar amounts
+     @return The amount in cents as an int, or an int64 array for an array
+    """
+    cents = np.rint(np.asarray(amount, dtype = np.float64) * CENTS_PER_DOLLAR).astype(np.int64)
+    return int(cents) if cents.ndim == 0 else cents
+
+def fromCents(cents):
+    """
+     @brief Convert whole cents back to dollar amounts.
+     @param cents An amount or array of amounts in cents
+     @return The amount in dollars as a float, or a float64 array for an array
+    """
+    dollars = np.asarray(cents, dtype = np.float64) / CENTS_PER_DOLLAR
+    return float(dollars) if dollars.ndim == 0 else dollars
+
+def settleCents(amounts):
+    """
+     @brief Settle amounts in whole cents without changing what they add up to. Every amount is rounded down to a whole cent and
+        the cents lost to rounding go back one each to the largest fractions, so each position moves by less than a cent and
+        the cents add up to the rounded total of the amounts. Nothing is moved from one position to another. Works on one row
+        of amounts or on a 2D array with one plan per row
+     @param amounts Array of non-negative dollar amounts, or a 2D array of one row of amounts per plan
+     @return int64 array of cents with the shape of amounts
+    """
+    oneRow  = np.ndim(amounts) == 1
+    quotas  = np.maximum(np.atleast_2d(np.asarray(amounts, dtype = np.float64)), 0) * CENTS_PER_DOLLAR
+    cents   = np.floor(quotas + _CENT_TOLERANCE).astype(np.int64)
+    remainders = quotas - cents
+    totals  = np.rint(quotas.sum(axis = 1)).astype(np.int64)
+
+    # Rank each row's fractions from largest to smallest and hand out the cents lost to rounding in that order
+    ranks = np.empty_like(cents)
+    order = np.argsort(-remainders, axis = 1, kind = "stable")
+    np.put_along_axis(ranks, order, np.arange(quotas.shape[1]), axis = 1)
+    missing = np.clip(totals - cents.sum(axis = 1), 0, quotas.shape[1])
+    cents += ranks < missing[:, None]
+    return cents[0] if oneRow else cents
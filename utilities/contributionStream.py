@@ -0,0 +1,130 @@
+import os
+import sys
+import csv
+import json
+import math
+
+def parseAmounts(text):
+    """
+     @brief Parse a list of contribution amounts.
+     @param text Comma separated amounts ( "100,250,1000" ) or an inclusive range as start:stop:step ( "100:10000:100" )
+     @return A list of amounts as floats. Raises ValueError unless every amount is a finite number greater than 0
+    """
+    # Inclusive range of evenly spaced amounts
+    if ":" in text:
+        try:
+            start, stop, step = (float(token) for token in text.split(":"))
+        except ValueError:
+            raise ValueError(f"Amount range {text} must be start:stop:step")
+        if not math.isfinite(step) or step <= 0:
+            raise ValueError(f"Step of amount range {text} must be a finite number greater than 0")
+        count = int(round((stop - start) / step)) + 1 if math.isfinite(stop - start) else 0
+        amounts = [start + i * step for i in range(count)]
+        if not amounts:
+            raise ValueError(f"Amount range {text} has no amounts, its stop is below its start")
+    else:
+        amounts = [float(token) for token in text.split(",") if token.strip()]
+    # NaN and infinity cannot be allocated, and there is nothing to allocate without a positive amount
+    for amount in amounts:
+        if not math.isfinite(amount) or amount <= 0:
+            raise ValueError(f"Amount {amount} must be a finite number greater than 0")
+    return amounts
+
+def readContributionLines(source):
+    """
+     @brief Read the contributions of a stream one line at a time, so amounts are handled as they arrive.
+     @param source '-' for standard input, the path of a file of contributions, or a list of amounts as given to L { parseAmounts }
+     @return Generator of (line number, line) tuples. Blank lines and lines starting with '#' are skipped
+    """
+    if source != "-" and not os.path.isfile(source):
+        for lineNumber, amount in enumerate(parseAmounts(source), start = 1):
+            yield lineNumber, str(amount)
+        return
+
+    f = sys.stdin if source == "-" else open(source)
+    try:
+        for lineNumber, line in enumerate(f, start = 1):
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield lineNumber, line
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def parseContribution(line):
+    """
+     @brief Parse one line of a contribution stream. Raises ValueError for a line that cannot be read or an amount that is not
+        a finite number greater than 0
+     @param line A plain amount ( "250" ) or a JSON object with an "amount" and an optional "id" ( {"id": "acct-7", "amount": 250} )
+     @return Tuple of the id ( None when not given ) and the amount
+    """
+    if not line.startswith("{"):
+        amountId, amount = None, float(line)
+    else:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"invalid JSON: {e.msg}")
+        if "amount" not in record:
+            raise ValueError("JSON contribution has no \"amount\"")
+        try:
+            amountId, amount = record.get("id"), float(record["amount"])
+        except TypeError:
+            raise ValueError(f"amount {record['amount']!r} is not a number")
+    # NaN and infinity cannot be allocated or written as JSON, and there is nothing to allocate without a positive amount
+    if not math.isfinite(amount) or amount <= 0:
+        raise ValueError(f"amount {amount} must be a finite number greater than 0")
+    return amountId, amount
+
+class ResultWriter:
+    FORMATS = ("json", "csv")
+
+    def __init__(self, outputFormat = "json", f = sys.stdout):
+        """
+         @brief Write the result of every contribution of a stream as soon as it is calculated. JSON is written as one object
+            per line. CSV gets a header from the symbols of the first result and one row per contribution, and errors are
+            written to standard error so the rows stay machine readable
+         @param outputFormat "json" or "csv" (default = "json")
+         @param f File to write the results to (default = sys.stdout)
+        """
+        if outputFormat not in ResultWriter.FORMATS:
+            raise Exception(f"Unknown output format {outputFormat}. Use one of {', '.join(ResultWriter.FORMATS)}")
+        self.outputFormat = outputFormat
+        self.f = f
+        self.csvWriter = csv.writer(f) if outputFormat == "csv" else None
+        self.symbols = None
+
+    def writeResult(self, lineNumber, amountId, amount, changes, balance):
+        """
+         @brief Write the allocation of one contribution.
+         @param lineNumber Line of the contribution in its stream
+         @param amountId Id given with the contribution, or None
+         @param amount The amount contributed
+         @param changes A dictionary of symbols to the amount bought
+         @param balance Balance of the portfolio after the contribution
+        """
+        invested = sum(changes.values())
+        if self.csvWriter:
+            if self.symbols is None:
+                self.symbols = list(changes)
+                self.csvWriter.writerow(["Line", "Id", "Amount", "Invested", "Balance"] + self.symbols)
+            self.csvWriter.writerow([lineNumber, "" if amountId is None else amountId, f"{amount:.2f}", f"{invested:.2f}", f"{balance:.2f}"] +
+                                    [f"{changes[symbol]:.2f}" for symbol in self.symbols])
+        else:
+            result = {"line" : lineNumber, "id" : amountId, "amount" : amount, "invested" : round(invested, 2),
+                      "balance" : round(balance, 2), "changes" : {symbol : round(value, 2) for symbol, value in changes.items()}}
+            self.f.write(json.dumps(result) + "\n")
+        # Flush every result so a reader at the other end of a pipe sees it straight away
+        self.f.flush()
+
+    def writeError(self, lineNumber, message):
+        """
+         @brief Report a contribution that could not be calculated, and carry on with the stream.
+         @param lineNumber Line of the contribution in its stream
+         @param message What went wrong
+        """
+        if self.csvWriter:
+            print(f"line {lineNumber}: {message}", file = sys.stderr)
+        else:
+            self.f.write(json.dumps({"line" : lineNumber, "error" : message}) + "\n")
+            self.f.flush()
@@ -1,19 +1,44 @@
-import traceback
-from enum import Enum
-from datetime import datetime, time
-import pytz
-import yfinance as yf
-
-class Day(Enum):
-    MONDAY    = 0
-    TUESDAY   = 1
-    WEDNESDAY = 2
-    THURSDAY  = 3
-    FRIDAY    = 4
-    SATURDAY  = 5
-    SUNDAY    = 6
+import queue
+import threading
+from time import monotonic, sleep, time
+from utilities.Constants import FetchConstants
+from utilities.marketCalendar import isMarketOpen
+
+class Quote:
+    __slots__ = ("symbol", "lastPrice", "previousClose", "timestamp", "currency")
+    
+    def __init__(self, symbol, lastPrice, previousClose, timestamp = None, currency = None):
+        """
+         @brief Initialize a compact quote record. Only the fields the calculations read are kept
+         @param symbol The stock symbol
+         @param lastPrice The last traded price
+         @param previousClose The close of the previous session
+         @param timestamp Epoch seconds the quote was fetched at (default = None, meaning now)
+         @param currency Currency the prices are in, if known (default = None)
+        """
+        self.symbol        = symbol
+        self.lastPrice     = float(lastPrice)
+        self.previousClose = float(previousClose)
+        self.timestamp     = time() if timestamp is None else timestamp
+        self.currency      = currency
+    
+    def __getitem__(self, key):
+        """
+         @brief Read a field by name so a Quote can be used wherever fast info data is expected.
+         @param key Name of the field ( "lastPrice", "previousClose", ... )
+         @return The value of the field
+        """
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
     
-_NEW_YORK_TZ = pytz.timezone('America/New_York')
+    def __repr__(self):
+        """
+         @brief Returns a string representation of the quote for debugging purposes.
+         @return A string in the form "Quote(symbol, lastPrice, previousClose)"
+        """
+        return f"Quote({self.symbol}, {self.lastPrice}, {self.previousClose})"
 
 class StockTickerData:
     def __init__(self, tickerData = None):
@@ -21,20 +46,44 @@ class StockTickerData:
          @brief Initialize the object with an optional paramater of data.
          @param tickerData A dictionary of ticker data. (default = None)
         """
-        self.tickerData = {} if not tickerData else tickerData
+        self.tickerData    = {} if not tickerData else tickerData
+        self.failedSymbols = {}
     
     def addTickerData(self, symbol, data):
         """
-         @brief Set the ticker data for a symbol.
+         @brief Set the ticker data for a symbol. Only a compact Quote is kept, not the object the data came from
          @param symbol The stock symbol to use as a key
-         @param data The yfinance fastData to be saved
+         @param data A Quote or a dict with "lastPrice", "previousClose" and optionally "currency"
         """
+        if not isinstance(data, Quote):
+            data = Quote(symbol, data["lastPrice"], data["previousClose"], currency = data.get("currency"))
         self.tickerData[symbol] = data
     
+    def addFailedSymbol(self, symbol, reason):
+        """
+         @brief Record a symbol that could not be fetched.
+         @param symbol The stock symbol that failed
+         @param reason A description of why the fetch failed
+        """
+        self.failedSymbols[symbol] = reason
+    
+    def clearFailedSymbols(self):
+        """
+         @brief Forget the symbols that failed so far, before fetching again.
+        """
+        self.failedSymbols = {}
+    
+    def getFailedSymbols(self):
+        """
+         @brief Returns the symbols that could not be fetched
+         @return A dictionary that maps symbol to the reason its fetch failed
+        """
+        return self.failedSymbols
+    
     def getTickerData(self):
         """
          @brief Returns the ticker data for all saved positions
-         @return A dictionary that maps symbol to the ticker data of that stock
+         @return A dictionary that maps symbol to the Quote of that stock
         """
         return self.tickerData
     
@@ -42,7 +91,7 @@ class StockTickerData:
         """
          @brief Get the ticker data for only one position. 
          @param symbol The symbol to look up.
-         @return The ticker data or None if not found.
+         @return The Quote or None if not found.
         """
         # Returns the ticker data if any.
         if not self.tickerData:
@@ -57,93 +106,230 @@ class StockTickerData:
 
 def _fetchTickers(stocks, tickerData):
     """
-     @brief Fetches information about the tickers. This is a wrapper for yf. Tickers which does not require a lot of API calls
+     @brief Fetches information about the tickers. All symbols are requested in one bulk download first and any symbol the
+        bulk request could not resolve is fetched individually on a bounded thread pool with retries
      @param stocks List of stock symbols to fetch information for
-     @param tickerData A dictionary of symbols to yfinance Ticker Data. Can be an empty dictionary to populate.
-     @return Dict with ticker : fastData for each ticker in stocks or {} if there is no ticker for any stocks
+     @param tickerData StockTickerData to populate. Symbols that could not be fetched are recorded with addFailedSymbol
+     @return Dict with ticker : fastData for each ticker that was fetched or {} if no ticker could be fetched
+    """
+    fastData = _fetchBulk(stocks, tickerData)
+    remaining = [symbol for symbol in stocks if symbol not in fastData]
+    
+    # Fall back to one request per symbol for whatever the bulk request missed
+    if remaining:
+        fastData.update(_fetchConcurrently(remaining, tickerData))
+        
+    return fastData
+
+def _fetchBulk(stocks, tickerData):
+    """
+     @brief Fetch the last two daily closes of every stock in a single yfinance download request.
+     @param stocks List of stock symbols to fetch
+     @param tickerData StockTickerData to add the fetched data to
+     @return Dict with ticker : {"lastPrice", "previousClose"} for each ticker the download resolved. {} if the request failed
     """
+    # yfinance pulls in pandas, so it is only imported once prices are actually fetched from it
+    import yfinance as yf
+    fastData = {}
     try:
-        fastData = {}
-        # Get fast info for each stock
-        if len(stocks) == 1:
-            ticker = yf.Ticker(stocks[0])
-            fastData[ticker.ticker] = ticker.get_fast_info()
-            tickerData.addTickerData(ticker.ticker, ticker)
-        else:
-            tickerList = yf.Tickers(stocks)
-            # Get fast data for each symbol in tickerList. tickers
-            for symbol in tickerList.tickers:
-                ticker = tickerList.tickers[symbol]    
-                fastData[symbol] = ticker.get_fast_info()
-                tickerData.addTickerData(symbol, ticker)
-            
+        history = yf.download(stocks, period = FetchConstants.BULK_PERIOD, interval = "1d", group_by = "column",
+                              progress = False, threads = True, auto_adjust = False)
+    except Exception as e:
+        print(f"Bulk price request failed, fetching symbols individually: {e}")
         return fastData
+    
+    if history is None or history.empty or "Close" not in history:
+        return fastData
+    
+    closes = history["Close"]
+    # A single symbol download may come back as a Series instead of a one column frame
+    if not hasattr(closes, "columns"):
+        closes = closes.to_frame(name = stocks[0])
+        
+    # Keep only symbols with at least two closes so previousClose is meaningful
+    for symbol in stocks:
+        if symbol not in closes.columns:
+            continue
+        symbolCloses = closes[symbol].dropna()
+        if len(symbolCloses) < 2:
+            continue
+        data = {"lastPrice"     : float(symbolCloses.iloc[-1]),
+                "previousClose" : float(symbolCloses.iloc[-2])}
+        fastData[symbol] = data
+        tickerData.addTickerData(symbol, data)
+        
+    return fastData
 
-    except ValueError as e:
-        print(f"Invalid stock symbol: {e}")
-        traceback.print_exc()
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        traceback.print_exc()
+def _fetchConcurrently(stocks, tickerData):
+    """
+     @brief Fetch each stock on a worker thread. The number of workers is bounded by FetchConstants.MAX_WORKERS. Each symbol
+        gets its own deadline, counted from when a worker starts on it, so symbols waiting for a free worker never time out.
+        A worker stuck on a symbol past its deadline is left behind as a daemon thread, which cannot keep the process alive,
+        and a new worker takes its place for the symbols still waiting
+     @param stocks List of stock symbols to fetch
+     @param tickerData StockTickerData to add the fetched data and failures to
+     @return Dict with ticker : {"lastPrice", "previousClose"} for each ticker that was fetched
+    """
+    fastData = {}
+    waiting = queue.Queue()
+    results = queue.Queue()
+    startTimes = {}
+    startLock = threading.Lock()
+    unfinished = set(stocks)
+    for symbol in unfinished:
+        waiting.put(symbol)
+
+    def work():
+        # Take symbols until none are left waiting
+        while True:
+            try:
+                symbol = waiting.get_nowait()
+            except queue.Empty:
+                return
+            with startLock:
+                startTimes[symbol] = monotonic()
+            try:
+                results.put((symbol, _fetchSingleTicker(symbol), None))
+            except Exception as e:
+                results.put((symbol, None, e))
+
+    def startWorker():
+        threading.Thread(target = work, daemon = True).start()
+
+    for _ in range(min(FetchConstants.MAX_WORKERS, len(unfinished))):
+        startWorker()
 
-def _getPrice(data):
+    # Allow every symbol a full set of attempts before giving up on it
+    deadline = FetchConstants.TIMEOUT_SECONDS * FetchConstants.MAX_RETRIES
+    while unfinished:
+        with startLock:
+            running = [startTimes[symbol] for symbol in unfinished if symbol in startTimes]
+        # Wake up for the next result or the next deadline, whichever comes first
+        timeout = max(min(running) + deadline - monotonic(), 0) if running else deadline
+        try:
+            symbol, data, error = results.get(timeout = timeout)
+            # A symbol that already timed out may still finish later, which is too late to use
+            if symbol in unfinished:
+                unfinished.discard(symbol)
+                if error is None:
+                    fastData[symbol] = data
+                    tickerData.addTickerData(symbol, data)
+                else:
+                    tickerData.addFailedSymbol(symbol, str(error))
+        except queue.Empty:
+            pass
+
+        now = monotonic()
+        with startLock:
+            expired = [symbol for symbol in unfinished if symbol in startTimes and now - startTimes[symbol] >= deadline]
+        for symbol in expired:
+            unfinished.discard(symbol)
+            tickerData.addFailedSymbol(symbol, f"Timed out after {deadline} seconds")
+            startWorker()
+
+    return fastData
+
+def _fetchSingleTicker(symbol):
+    """
+     @brief Fetch the fast info of one stock, retrying with exponential backoff. Both prices are read here so the lazy
+        network requests happen on the worker thread
+     @param symbol The stock symbol to fetch
+     @return A dict with the "lastPrice", "previousClose" and "currency" of the stock
+    """
+    import yfinance as yf
+    lastError = None
+    start = monotonic()
+    # Retry until the attempts or the time budget for this symbol run out
+    for attempt in range(FetchConstants.MAX_RETRIES):
+        try:
+            ticker = yf.Ticker(symbol)
+            fastInfo = ticker.get_fast_info()
+            data = {"lastPrice"     : float(fastInfo["lastPrice"]),
+                    "previousClose" : float(fastInfo["previousClose"])}
+            data["currency"] = _getCurrency(fastInfo)
+            return data
+        except Exception as e:
+            lastError = e
+        if monotonic() - start > FetchConstants.TIMEOUT_SECONDS:
+            break
+        sleep(FetchConstants.BACKOFF_SECONDS * (2 ** attempt))
+        
+    raise ValueError(f"Invalid stock symbol or no data for '{symbol}': {lastError}")
+
+def _getCurrency(fastInfo):
+    """
+     @brief Read the currency of a stock. A missing currency does not fail a stock whose prices were read
+     @param fastInfo The fast info of the stock
+     @return The currency code, or FetchConstants.DEFAULT_CURRENCY if it could not be read
+    """
+    try:
+        return fastInfo["currency"] or FetchConstants.DEFAULT_CURRENCY
+    except Exception:
+        return FetchConstants.DEFAULT_CURRENCY
+
+def _getPrice(data, marketOpen):
     """
      @brief Get the price of the stock current value. This is based on the market state or the previous close price.
      @param data Ticker object of a stock
-     @return Price of the trade as a float between 0 and 1. If the market is open it will return the last price
+     @param marketOpen True if the market is open
+     @return Price of the trade as a float. If the market is open it will return the last price
     """
-    price = data["lastPrice"] if _isMarketOpen() else data["previousClose"]
+    price = data["lastPrice"] if marketOpen else data["previousClose"]
     return price
 
 def _getPrices(tickerFastData):
     """
-     @brief Get prices for each ticker. This is a wrapper around _getPrice to avoid having to re - map the ticker data
+     @brief Get prices for each ticker. This is a wrapper around _getPrice to avoid having to re - map the ticker data.
+        The market state is checked once so every symbol in the batch uses the same price field
      @param tickerFastData dictionary of ticker data. ( {symbol: Ticker} )
      @return dictionary of ticker data with price in decimal format ( {symbol: Price} )
     """
     prices = {}
+    marketOpen = _isMarketOpen()
     
     # Get the price of the ticker data for each symbol.
     for symbol, tickerData in tickerFastData.items():
-        prices[symbol] = _getPrice(tickerData)
+        prices[symbol] = _getPrice(tickerData, marketOpen)
 
     return prices
         
 def _isMarketOpen():
-   """
-    @brief Check if market is open. Determine if we're on the market's day and time that is a weekday and open time.
-    @return True if market is open False otherwise. Note that the return value does not depend on the state of the system
-   """
-   newYorkNow = datetime.now(_NEW_YORK_TZ)
-   dateNow = newYorkNow.date()
-   timeNow = newYorkNow.time()
-   return _isWeekday(dateNow) and _isOpenTime(timeNow)
-   
-def _isWeekday(dateObj):
-    """
-     @brief Checks if dateObj is a weekday.
-     @param dateObj the date to examine.
-     @return C { True } if the dateObj is a weekday C { False } otherwise. >>> _isWeekday ( date )
     """
-    return dateObj.weekday() != Day.SATURDAY and dateObj.weekday() != Day.SUNDAY
-
-def _isOpenTime(timeObj):
-    """
-     @brief Check if timeObj is between 9:30 AM and 4:30 PM.
-     @param timeObj A datetime object representing the time to check
-     @return True if timeObj is between9:30 AM and 4:30 PM. False otherwise
+     @brief Check if market is open. Uses the precomputed NYSE calendar, so holidays and early closes are respected
+     @return True if market is open False otherwise
     """
-    openTime  = time(hour = 9, minute = 30, tzinfo = _NEW_YORK_TZ)
-    closeTime = time(hour = 16, minute = 30, tzinfo = _NEW_YORK_TZ)
-    return timeObj > openTime and timeObj < closeTime
+    return isMarketOpen()
 
-def fetchLatestPrices(stocks, tickerData):
+def fetchLatestPrices(stocks, tickerData, quoteCache = None, provider = None):
     """
      @brief Get the latest prices for a list of stocks. This is a wrapper around _fetchTickers to allow us to do this in one call
      @param stocks A list of stock symbols to query ( ['AAPL', 'MSFT'] )
-     @param tickerData A dictionary of symbols to yfinance Ticker Data. Can be an empty dictionary to populate.
+     @param tickerData StockTickerData that keeps a compact Quote per fetched symbol
+     @param quoteCache Optional QuoteCache used to serve prices fetched earlier in the same session (default = None)
+     @param provider Optional PriceProvider to get the prices from. yfinance is used when not given (default = None)
      @return A dictionary of prices keyed by stock ( ex. {'AAPL': 1234.56, 'MSFT': 5678.90} )
     """
-    marketData = _fetchTickers(stocks, tickerData)
-    prices = _getPrices(marketData)
+    prices = {}
+    stocksToFetch = stocks
+    # Serve what we can from the cache and only fetch the rest
+    if quoteCache is not None:
+        prices = quoteCache.getPrices(stocks)
+        stocksToFetch = [symbol for symbol in stocks if symbol not in prices]
+    
+    if stocksToFetch:
+        if provider is None:
+            marketData = _fetchTickers(stocksToFetch, tickerData)
+        else:
+            marketData = provider.fetchFastData(stocksToFetch, tickerData)
+        fetchedPrices = _getPrices(marketData)
+        
+        # Report the symbols that could not be fetched at all
+        failedSymbols = tickerData.getFailedSymbols()
+        if failedSymbols:
+            print(f"Could not fetch market data for: {', '.join(sorted(failedSymbols))}")
+        prices.update(fetchedPrices)
+        if quoteCache is not None:
+            quoteCache.addPrices(fetchedPrices)
+            quoteCache.save()
+    
     return prices
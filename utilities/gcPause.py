@@ -0,0 +1,16 @@
+import gc
+from contextlib import contextmanager
+
+@contextmanager
+def pausedGarbageCollection():
+    """
+     @brief Pause the cycle collector while many small objects are built. Building a million Positions would otherwise set it
+        off over and over, though none of them can form a cycle. The collector is only turned back on if it was on before
+    """
+    wasEnabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if wasEnabled:
+            gc.enable()
@@ -0,0 +1,246 @@
+import os
+import json
+from datetime import date, timedelta
+import numpy as np
+from utilities.Constants import HistoryConstants
+from utilities.priceHistory import getTradingDays
+
+class PriceHistoryStore:
+    def __init__(self, directory = HistoryConstants.STORE_PATH, startDate = None):
+        """
+         @brief Open or create a local price history store. Prices are kept in one memory mapped float64 file laid out as
+            trading days by symbols, with an index of each symbol's column and the range of days it covers
+         @param directory Directory holding the store files (default = HistoryConstants.STORE_PATH)
+         @param startDate First trading day of the store. An existing store that starts later is extended back to it
+            (default = None, meaning HistoryConstants.DEFAULT_YEARS years ago for a new store)
+        """
+        self.directory  = directory
+        self.indexPath  = os.path.join(directory, HistoryConstants.INDEX_FILE)
+        self.pricesPath = os.path.join(directory, HistoryConstants.PRICES_FILE)
+        os.makedirs(directory, exist_ok = True)
+
+        # Load the index of an existing store, or start an empty one
+        if os.path.exists(self.indexPath):
+            with open(self.indexPath) as f:
+                index = json.load(f)
+            self.startDate = date.fromisoformat(index["startDate"])
+            self.dates     = [date.fromisoformat(day) for day in index["dates"]]
+            self.symbols   = index["symbols"]
+            self.coverage  = index["coverage"]
+            self.capacity  = index["capacity"]
+        else:
+            if startDate is None:
+                today = date.today()
+                startDate = today.replace(year = today.year - HistoryConstants.DEFAULT_YEARS)
+            self.startDate = startDate
+            self.dates     = []
+            self.symbols   = []
+            self.coverage  = {}
+            self.capacity  = HistoryConstants.SYMBOL_CAPACITY
+            open(self.pricesPath, "wb").close()
+            self._saveIndex()
+
+        self.dateIndex   = {day : i for i, day in enumerate(self.dates)}
+        self.symbolIndex = {symbol : i for i, symbol in enumerate(self.symbols)}
+        self._mapPrices()
+        # A longer history than the store holds adds rows before its first day, which update then fills
+        if startDate is not None and startDate < self.startDate:
+            self._prependDates(startDate)
+
+    def getPrices(self, symbols = None, start = None, end = None):
+        """
+         @brief Read prices for a date range. The rows of a date range are a view into the memory mapped file, so nothing is
+            copied when all symbols or symbols stored next to each other are read. Any other symbol set gathers just its columns
+         @param symbols Symbols to read, in this order (default = None, meaning every symbol in store order)
+         @param start First date to read (default = None, meaning the first date in the store)
+         @param end Last date to read (default = None, meaning the last date in the store)
+         @return Tuple of a list of dates, a list of symbols and a 2D array of prices with shape (dates, symbols)
+        """
+        first = 0 if start is None else np.searchsorted(self._ordinals, start.toordinal(), side = "left")
+        last  = len(self.dates) if end is None else np.searchsorted(self._ordinals, end.toordinal(), side = "right")
+        rows  = self.prices[first:last]
+        dates = self.dates[first:last]
+
+        # Every symbol, or a run of neighbouring columns, is a plain slice of the mapped rows
+        if symbols is None:
+            return dates, list(self.symbols), rows[:, :len(self.symbols)]
+        columns = [self.symbolIndex.get(symbol, -1) for symbol in symbols]
+        if columns and columns[0] >= 0 and columns == list(range(columns[0], columns[0] + len(columns))):
+            return dates, list(symbols), rows[:, columns[0]:columns[0] + len(columns)]
+
+        selected = np.full((len(dates), len(symbols)), np.nan)
+        for i, column in enumerate(columns):
+            if column >= 0:
+                selected[:, i] = rows[:, column]
+        return dates, list(symbols), selected
+
+    def getCoverage(self, symbol):
+        """
+         @brief Get the range of dates a symbol has been filled for.
+         @param symbol The symbol to look up
+         @return Tuple of the first and last date covered, or None if the symbol is not in the store
+        """
+        if symbol not in self.coverage:
+            return None
+        first, last = self.coverage[symbol]
+        return self.dates[first], self.dates[last]
+
+    def update(self, provider, symbols, end = None):
+        """
+         @brief Fetch only the days missing for each symbol, before and after the days it covers, and write them to the store.
+            Symbols already covered from the first day of the store up to end are not fetched at all, and symbols missing the
+            same days share one request. Coverage only reaches as far as the last day a price was returned for, so days the
+            provider had no prices for yet are asked for again on the next update
+         @param provider PriceProvider with fetchHistory to get the missing prices from
+         @param symbols Symbols to bring up to date
+         @param end Last date to cover (default = None, meaning yesterday, the last day with a final close)
+         @return Number of symbols that were fetched
+        """
+        end = date.today() - timedelta(days = 1) if end is None else end
+        self._extendDates(end)
+        lastRow = np.searchsorted(self._ordinals, end.toordinal(), side = "right") - 1
+        if lastRow < 0:
+            return 0
+
+        # The ranges of rows each symbol is missing, before the first and after the last row it covers
+        missing = {}
+        for symbol in symbols:
+            covered = self.coverage.get(symbol)
+            if covered is None:
+                ranges = [(0, lastRow)]
+            else:
+                ranges = [(0, covered[0] - 1), (covered[1] + 1, lastRow)]
+            ranges = [(first, last) for first, last in ranges if first <= last]
+            if ranges:
+                missing[symbol] = ranges
+        if not missing:
+            return 0
+
+        self._addSymbols([symbol for symbol in missing if symbol not in self.symbolIndex])
+        # Symbols missing the same days are fetched together, which is usually every symbol in one request
+        groups = {}
+        for symbol, ranges in missing.items():
+            for missingRange in ranges:
+                groups.setdefault(missingRange, []).append(symbol)
+        for (firstMissing, lastMissing), groupSymbols in groups.items():
+            fetchedDates, fetchedPrices = provider.fetchHistory(groupSymbols, self.dates[firstMissing], self.dates[lastMissing])
+            rows = np.array([self.dateIndex.get(day, -1) for day in fetchedDates], dtype = np.intp)
+            keep = (rows >= firstMissing) & (rows <= lastMissing)
+            rows, fetchedPrices = rows[keep], fetchedPrices[keep]
+            # Write only the missing cells, then record what each symbol now covers
+            columns = [self.symbolIndex[symbol] for symbol in groupSymbols]
+            self.prices[np.ix_(rows, columns)] = fetchedPrices
+            for i, symbol in enumerate(groupSymbols):
+                self._updateCoverage(symbol, firstMissing, rows[~np.isnan(fetchedPrices[:, i])])
+        self.prices.flush()
+        self._saveIndex()
+        return len(missing)
+
+    def _updateCoverage(self, symbol, firstFetched, rowsWithPrices):
+        """
+         @brief Record the rows a symbol covers after a fetch. The covered range starts at the first row asked for, so days
+            before a symbol listed are not asked for again, and ends at the last row a price was returned for
+         @param symbol The symbol that was fetched
+         @param firstFetched First row of the fetched range
+         @param rowsWithPrices Rows of the fetched range that a price was returned for
+        """
+        covered = self.coverage.get(symbol)
+        first = firstFetched if covered is None else min(covered[0], firstFetched)
+        last = None if covered is None else covered[1]
+        if len(rowsWithPrices):
+            last = int(rowsWithPrices.max()) if last is None else max(last, int(rowsWithPrices.max()))
+        # A symbol nothing was returned for is not covered at all, so it is fetched again in full
+        if last is not None:
+            self.coverage[symbol] = [int(first), int(last)]
+
+    def _extendDates(self, end):
+        """
+         @brief Append rows for the trading days after the last stored date up to end.
+         @param end Last date the store should have a row for
+        """
+        first = self.dates[-1] + timedelta(days = 1) if self.dates else self.startDate
+        newDates = getTradingDays(first, end)
+        if not newDates:
+            return
+        # Grow the file by whole rows and map it again
+        self._writeEmptyRows(len(newDates))
+        for day in newDates:
+            self.dateIndex[day] = len(self.dates)
+            self.dates.append(day)
+        self._mapPrices()
+        self._saveIndex()
+
+    def _prependDates(self, start):
+        """
+         @brief Insert rows for the trading days from start up to the first stored date. The file is rewritten with the new
+            rows first, and the covered rows of every symbol move down with their prices
+         @param start New first date of the store
+        """
+        newDates = getTradingDays(start, self.startDate - timedelta(days = 1))
+        self.startDate = start
+        if newDates and self.dates:
+            extended = np.full((len(newDates) + len(self.dates), self.capacity), np.nan)
+            extended[len(newDates):] = self.prices
+            del self.prices
+            extended.tofile(f"{self.pricesPath}.tmp")
+            os.replace(f"{self.pricesPath}.tmp", self.pricesPath)
+            self.dates = newDates + self.dates
+            self.dateIndex = {day : i for i, day in enumerate(self.dates)}
+            self.coverage = {symbol : [first + len(newDates), last + len(newDates)] for symbol, (first, last) in self.coverage.items()}
+            self._mapPrices()
+        self._saveIndex()
+
+    def _addSymbols(self, newSymbols):
+        """
+         @brief Give new symbols a column. When the columns run out the file is rewritten with double the capacity
+         @param newSymbols Symbols not yet in the store
+        """
+        if not newSymbols:
+            return
+        needed = len(self.symbols) + len(newSymbols)
+        if needed > self.capacity:
+            capacity = self.capacity
+            while capacity < needed:
+                capacity *= 2
+            resized = np.full((len(self.dates), capacity), np.nan)
+            resized[:, :self.capacity] = self.prices
+            del self.prices
+            resized.tofile(f"{self.pricesPath}.tmp")
+            os.replace(f"{self.pricesPath}.tmp", self.pricesPath)
+            self.capacity = capacity
+            self._mapPrices()
+
+        for symbol in newSymbols:
+            self.symbolIndex[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+
+    def _writeEmptyRows(self, count):
+        """
+         @brief Append rows of missing prices to the prices file.
+         @param count Number of rows to append
+        """
+        with open(self.pricesPath, "ab") as f:
+            np.full((count, self.capacity), np.nan).tofile(f)
+
+    def _mapPrices(self):
+        """
+         @brief Memory map the prices file with the current number of dates and capacity.
+        """
+        self._ordinals = np.array([day.toordinal() for day in self.dates], dtype = np.int64)
+        if not self.dates:
+            self.prices = np.empty((0, self.capacity))
+            return
+        self.prices = np.memmap(self.pricesPath, dtype = np.float64, mode = "r+", shape = (len(self.dates), self.capacity))
+
+    def _saveIndex(self):
+        """
+         @brief Write the index of dates, symbols and coverage. The file is replaced atomically.
+        """
+        tempPath = f"{self.indexPath}.tmp"
+        with open(tempPath, "w") as f:
+            json.dump({"startDate" : self.startDate.isoformat(),
+                       "dates"     : [day.isoformat() for day in self.dates],
+                       "symbols"   : self.symbols,
+                       "coverage"  : self.coverage,
+                       "capacity"  : self.capacity}, f)
+        os.replace(tempPath, self.indexPath)
@@ -0,0 +1,209 @@
+from enum import Enum
+from datetime import date, datetime, time, timedelta
+
+class Day(Enum):
+    MONDAY    = 0
+    TUESDAY   = 1
+    WEDNESDAY = 2
+    THURSDAY  = 3
+    FRIDAY    = 4
+    SATURDAY  = 5
+    SUNDAY    = 6
+
+_OPEN_TIME    = time(hour = 9, minute = 30)
+_CLOSE_TIME   = time(hour = 16)
+_EARLY_CLOSE  = time(hour = 13)
+_calendars    = {}
+
+def getNewYorkTimezone():
+    """
+     @brief The timezone of the exchange. pytz is imported the first time it is needed rather than when this module is
+     @return The America/New_York pytz timezone
+    """
+    import pytz
+    return pytz.timezone("America/New_York")
+
+class MarketCalendar:
+    def __init__(self, year):
+        """
+         @brief Precompute the NYSE trading sessions of a year, including holidays and early closes.
+         @param year The calendar year to build sessions for
+        """
+        self.year     = year
+        self.holidays = _getHolidays(year)
+        self.sessions = {}
+        earlyCloses   = _getEarlyCloses(year, self.holidays)
+
+        newYorkTz = getNewYorkTimezone()
+        # Map every trading day to its open and close time in New York
+        day = date(year, 1, 1)
+        while day.year == year:
+            if day.weekday() < Day.SATURDAY.value and day not in self.holidays:
+                closeTime = _EARLY_CLOSE if day in earlyCloses else _CLOSE_TIME
+                self.sessions[day] = (newYorkTz.localize(datetime.combine(day, _OPEN_TIME)),
+                                      newYorkTz.localize(datetime.combine(day, closeTime)))
+            day += timedelta(days = 1)
+
+    def getSession(self, day):
+        """
+         @brief Get the trading session of a day.
+         @param day The date to look up
+         @return Tuple of the aware open and close datetimes or None if the market is closed all day
+        """
+        return self.sessions.get(day)
+
+def getCalendar(year):
+    """
+     @brief Get the calendar for a year. Calendars are built once and cached for the life of the process
+     @param year The calendar year
+     @return The MarketCalendar for year
+    """
+    # Build the calendar the first time the year is asked for
+    if year not in _calendars:
+        _calendars[year] = MarketCalendar(year)
+    return _calendars[year]
+
+def getSession(day):
+    """
+     @brief Get the trading session of a day.
+     @param day The date to look up
+     @return Tuple of the aware open and close datetimes or None if the market is closed all day
+    """
+    return getCalendar(day.year).getSession(day)
+
+def isMarketOpen(newYorkNow = None):
+    """
+     @brief Check if the market is open at a moment in time.
+     @param newYorkNow Aware datetime to check (default = None, meaning now)
+     @return True if newYorkNow falls inside a trading session, False otherwise
+    """
+    newYorkTz = getNewYorkTimezone()
+    if newYorkNow is None:
+        newYorkNow = datetime.now(newYorkTz)
+    newYorkNow = newYorkNow.astimezone(newYorkTz)
+    session = getSession(newYorkNow.date())
+    return session is not None and session[0] <= newYorkNow < session[1]
+
+def getNextSessionOpen(newYorkNow = None):
+    """
+     @brief Find the start of the next trading session after newYorkNow. Used to decide how long a closed-market quote stays valid
+     @param newYorkNow Aware datetime to search from (default = None, meaning now)
+     @return Aware datetime of the next session open strictly after newYorkNow
+    """
+    newYorkTz = getNewYorkTimezone()
+    if newYorkNow is None:
+        newYorkNow = datetime.now(newYorkTz)
+    newYorkNow = newYorkNow.astimezone(newYorkTz)
+    day = newYorkNow.date()
+    # Step forward one day at a time until a session opens in the future
+    while True:
+        session = getSession(day)
+        if session is not None and session[0] > newYorkNow:
+            return session[0]
+        day += timedelta(days = 1)
+
+def getSessionKey(newYorkNow = None):
+    """
+     @brief Identify the trading session a quote belongs to. Quotes fetched in the same session are interchangeable
+     @param newYorkNow Aware datetime (default = None, meaning now)
+     @return "open:<date>" while the market is open, otherwise "closed:<date of next session>"
+    """
+    newYorkTz = getNewYorkTimezone()
+    if newYorkNow is None:
+        newYorkNow = datetime.now(newYorkTz)
+    newYorkNow = newYorkNow.astimezone(newYorkTz)
+    # An open session is identified by its own date
+    if isMarketOpen(newYorkNow):
+        return f"open:{newYorkNow.date().isoformat()}"
+    return f"closed:{getNextSessionOpen(newYorkNow).date().isoformat()}"
+
+def _getHolidays(year):
+    """
+     @brief Get the full day NYSE holidays of a year, moved to the observed weekday.
+     @param year The calendar year
+     @return Set of dates the market is closed on
+    """
+    holidays = {_nthWeekday(year, 1, Day.MONDAY, 3),          # Martin Luther King Jr. Day
+                _nthWeekday(year, 2, Day.MONDAY, 3),          # Washington's Birthday
+                _getEaster(year) - timedelta(days = 2),       # Good Friday
+                _lastWeekday(year, 5, Day.MONDAY),            # Memorial Day
+                _observed(date(year, 7, 4)),                  # Independence Day
+                _nthWeekday(year, 9, Day.MONDAY, 1),          # Labor Day
+                _nthWeekday(year, 11, Day.THURSDAY, 4),       # Thanksgiving Day
+                _observed(date(year, 12, 25))}                # Christmas Day
+
+    # New Year's Day on a Saturday is not observed on the Friday before
+    newYear = date(year, 1, 1)
+    if newYear.weekday() != Day.SATURDAY.value:
+        holidays.add(_observed(newYear))
+    # Juneteenth has been a market holiday since 2022
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))
+    return holidays
+
+def _getEarlyCloses(year, holidays):
+    """
+     @brief Get the days the NYSE closes at 1:00 PM.
+     @param year The calendar year
+     @param holidays Set of full day holidays of the year
+     @return Set of early close dates
+    """
+    candidates = [date(year, 7, 3),                                               # Day before Independence Day
+                  _nthWeekday(year, 11, Day.THURSDAY, 4) + timedelta(days = 1),   # Day after Thanksgiving
+                  date(year, 12, 24)]                                             # Christmas Eve
+    return {day for day in candidates if day.weekday() < Day.SATURDAY.value and day not in holidays}
+
+def _observed(day):
+    """
+     @brief Move a holiday falling on a weekend to the weekday it is observed on.
+     @param day The holiday date
+     @return The Friday before for a Saturday, the Monday after for a Sunday, otherwise day
+    """
+    if day.weekday() == Day.SATURDAY.value:
+        return day - timedelta(days = 1)
+    if day.weekday() == Day.SUNDAY.value:
+        return day + timedelta(days = 1)
+    return day
+
+def _nthWeekday(year, month, weekday, n):
+    """
+     @brief Find the nth occurrence of a weekday in a month.
+     @param year The year
+     @param month The month
+     @param weekday Day enum of the weekday wanted
+     @param n Which occurrence, starting at 1
+     @return The date of the occurrence
+    """
+    first = date(year, month, 1)
+    offset = (weekday.value - first.weekday()) % 7
+    return first + timedelta(days = offset + 7 * (n - 1))
+
+def _lastWeekday(year, month, weekday):
+    """
+     @brief Find the last occurrence of a weekday in a month.
+     @param year The year
+     @param month The month
+     @param weekday Day enum of the weekday wanted
+     @return The date of the occurrence
+    """
+    nextMonth = date(year + month // 12, month % 12 + 1, 1)
+    last = nextMonth - timedelta(days = 1)
+    return last - timedelta(days = (last.weekday() - weekday.value) % 7)
+
+def _getEaster(year):
+    """
+     @brief Compute the date of Western Easter Sunday with the anonymous Gregorian algorithm.
+     @param year The year
+     @return The date of Easter Sunday
+    """
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
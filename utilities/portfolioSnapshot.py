@@ -0,0 +1,137 @@
+import os
+import json
+import hashlib
+import traceback
+import numpy as np
+from portfolioComponents.Position import Position
+from utilities.gcPause import pausedGarbageCollection
+from utilities.Constants import SnapshotConstants, GroupConstants
+
+_COLUMNS = ("symbols", "groups", "percentWanted", "quantityShares", "ignore")
+
+class PortfolioSnapshot:
+    def __init__(self, snapshotDir = SnapshotConstants.SNAPSHOT_PATH):
+        """
+         @brief Initialize the store of parsed portfolio snapshots. Each portfolio file gets a directory of column arrays and a
+            meta file holding the fingerprint of the file they were parsed from
+         @param snapshotDir Directory to keep the snapshots in (default = SnapshotConstants.SNAPSHOT_PATH)
+        """
+        self.snapshotDir = snapshotDir
+
+    def getFingerprint(self, filename):
+        """
+         @brief Fingerprint a portfolio file by its path, size, modification time and content hash.
+         @param filename Path of the portfolio file
+         @return A dictionary with the path, size, mtime and hash of the file
+        """
+        stat = os.stat(filename)
+        return {"path"  : os.path.realpath(filename),
+                "size"  : stat.st_size,
+                "mtime" : stat.st_mtime_ns,
+                "hash"  : _hashFile(filename)}
+
+    def load(self, filename):
+        """
+         @brief Load the positions of a portfolio file from its snapshot. The size and modification time are compared first so a
+            changed file is turned away without being read, and the content hash is checked before a snapshot is used
+         @param filename Path of the portfolio file
+         @return The list of Positions, or None if there is no snapshot that matches the file
+        """
+        snapshotPath = self._getSnapshotPath(filename)
+        metaPath = os.path.join(snapshotPath, SnapshotConstants.META_FILE)
+        if not os.path.exists(metaPath):
+            return None
+
+        try:
+            with open(metaPath) as f:
+                meta = json.load(f)
+            stat = os.stat(filename)
+            fingerprint = meta["fingerprint"]
+            # A different size or modification time means the file changed, without reading it
+            if meta["version"] != SnapshotConstants.FORMAT_VERSION or fingerprint["size"] != stat.st_size or \
+               fingerprint["mtime"] != stat.st_mtime_ns or fingerprint["path"] != os.path.realpath(filename):
+                return None
+            if self.getFingerprint(filename) != fingerprint:
+                return None
+
+            # Map the columns instead of reading them
+            columns = {name : np.load(os.path.join(snapshotPath, f"{name}.npy"), mmap_mode = "r") for name in _COLUMNS}
+            return _toPositions(columns)
+        except Exception:
+            print("Could not read portfolio snapshot, parsing the file instead.")
+            traceback.print_exc()
+            return None
+
+    def save(self, filename, positions, fingerprint = None):
+        """
+         @brief Save the parsed positions of a portfolio file as column arrays. The meta file is removed first and written last,
+            so a snapshot that is only partly written is never used
+         @param filename Path of the portfolio file the positions were parsed from
+         @param positions List of Positions parsed from the file
+         @param fingerprint Fingerprint of the file as it was parsed (default = None, meaning take it now)
+        """
+        snapshotPath = self._getSnapshotPath(filename)
+        metaPath = os.path.join(snapshotPath, SnapshotConstants.META_FILE)
+        try:
+            fingerprint = fingerprint or self.getFingerprint(filename)
+            os.makedirs(snapshotPath, exist_ok = True)
+            try:
+                os.remove(metaPath)
+            except FileNotFoundError:
+                pass
+
+            columns = {"symbols"        : np.array([pos.symbol for pos in positions], dtype = str),
+                       "groups"         : np.array([GroupConstants.SEPARATOR.join(pos.group) for pos in positions], dtype = str),
+                       "percentWanted"  : np.array([pos.percentWanted for pos in positions], dtype = np.float64),
+                       "quantityShares" : np.array([pos.quantityShares for pos in positions], dtype = np.float64),
+                       "ignore"         : np.array([pos.ignore for pos in positions], dtype = bool)}
+            # Write each column next to its final name and move it into place. Temporary files are named by process so processes
+            # saving the same snapshot never write into each other's files
+            for name, column in columns.items():
+                tempPath = os.path.join(snapshotPath, f"{name}.{os.getpid()}.tmp.npy")
+                np.save(tempPath, column)
+                os.replace(tempPath, os.path.join(snapshotPath, f"{name}.npy"))
+
+            tempPath = f"{metaPath}.{os.getpid()}.tmp"
+            with open(tempPath, "w") as f:
+                json.dump({"version" : SnapshotConstants.FORMAT_VERSION, "fingerprint" : fingerprint, "rows" : len(positions)}, f)
+            os.replace(tempPath, metaPath)
+        except Exception:
+            traceback.print_exc()
+
+    def _getSnapshotPath(self, filename):
+        """
+         @brief Directory of the snapshot of a portfolio file, named by a hash of its full path.
+         @param filename Path of the portfolio file
+         @return Path of the snapshot directory
+        """
+        key = hashlib.blake2b(os.path.realpath(filename).encode(), digest_size = 8).hexdigest()
+        return os.path.join(self.snapshotDir, key)
+
+def _hashFile(filename):
+    """
+     @brief Hash the contents of a file in chunks.
+     @param filename Path of the file
+     @return Hex digest of the file contents
+    """
+    digest = hashlib.blake2b(digest_size = 16)
+    with open(filename, "rb") as f:
+        # Read a chunk at a time so large files are not held in memory
+        for chunk in iter(lambda: f.read(SnapshotConstants.HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _toPositions(columns):
+    """
+     @brief Build Positions from the column arrays of a snapshot.
+     @param columns A dictionary of column name to array
+     @return A list of Positions
+    """
+    groups = [tuple(group.split(GroupConstants.SEPARATOR)) if group else () for group in columns["groups"].tolist()]
+    with pausedGarbageCollection():
+        return [Position.fromValues(symbol, percentWanted, quantityShares, ignore, group)
+                for symbol, percentWanted, quantityShares, ignore, group in zip(columns["symbols"].tolist(),
+                                                                                columns["percentWanted"].tolist(),
+                                                                                columns["quantityShares"].tolist(),
+                                                                                columns["ignore"].tolist(),
+                                                                                groups)]
@@ -0,0 +1,67 @@
+import csv
+from datetime import date, timedelta
+import numpy as np
+from utilities.marketCalendar import getSession
+
+def readPriceHistory(filename, symbols = None):
+    """
+     @brief Read a wide price history CSV. The first row is "Date" followed by one column per symbol and every following row
+        is an ISO date followed by the price of each symbol. Blank cells are read as missing prices
+     @param filename Path of the CSV file
+     @param symbols Symbols to return, in this order (default = None, meaning every column in file order)
+     @return Tuple of a list of dates, a list of symbols and a 2D array of prices with shape (dates, symbols)
+    """
+    with open(filename, newline = "") as f:
+        reader = csv.reader(f)
+        header = [token.strip() for token in next(reader)]
+        dates  = []
+        rows   = []
+        # One row of prices per date, skipping blank lines
+        for row in reader:
+            if not row or not row[0].strip():
+                continue
+            dates.append(date.fromisoformat(row[0].strip()))
+            rows.append([float(token) if token.strip() else np.nan for token in row[1:]])
+
+    fileSymbols = header[1:]
+    prices = np.array(rows, dtype = np.float64).reshape(len(rows), len(fileSymbols))
+    if symbols is None:
+        return dates, fileSymbols, prices
+
+    # Reorder the columns to the symbols asked for. Symbols not in the file have no prices
+    columnIndex = {symbol : i for i, symbol in enumerate(fileSymbols)}
+    selected = np.full((len(dates), len(symbols)), np.nan)
+    for i, symbol in enumerate(symbols):
+        if symbol in columnIndex:
+            selected[:, i] = prices[:, columnIndex[symbol]]
+    return dates, list(symbols), selected
+
+def writePriceHistory(filename, dates, symbols, prices):
+    """
+     @brief Write a price history in the wide CSV layout read by readPriceHistory.
+     @param filename Path of the CSV file to write
+     @param dates List of dates, one per row of prices
+     @param symbols List of symbols, one per column of prices
+     @param prices 2D array of prices with shape (dates, symbols)
+    """
+    with open(filename, "w", newline = "") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Date"] + list(symbols))
+        for day, row in zip(dates, prices):
+            writer.writerow([day.isoformat()] + ["" if np.isnan(price) else f"{price:.4f}" for price in row])
+
+def getTradingDays(start, end):
+    """
+     @brief List the NYSE trading days between two dates.
+     @param start First date to include
+     @param end Last date to include
+     @return A list of the dates the market had a session on
+    """
+    days = []
+    day = start
+    # Keep the days the market calendar has a session for
+    while day <= end:
+        if getSession(day) is not None:
+            days.append(day)
+        day += timedelta(days = 1)
+    return days
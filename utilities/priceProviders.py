@@ -0,0 +1,207 @@
+import os
+import csv
+import json
+import zlib
+from datetime import timedelta
+import numpy as np
+from utilities.fetchStock import _fetchTickers
+from utilities.priceHistory import getTradingDays
+
+_SYNTHETIC_DRIFT      = 0.0003
+_SYNTHETIC_VOLATILITY = 0.015
+
+class PriceProvider:
+    """
+     @brief Source of price data for fetchLatestPrices. Subclasses implement fetchFastData
+    """
+    def fetchFastData(self, stocks, tickerData):
+        """
+         @brief Fetch the price data for a list of stocks.
+         @param stocks List of stock symbols to fetch
+         @param tickerData StockTickerData to add the fetched data and failures to
+         @return Dict with ticker : {"lastPrice", "previousClose"} for each ticker that was found
+        """
+        raise NotImplementedError
+
+    def fetchHistory(self, stocks, start, end):
+        """
+         @brief Fetch daily closing prices for a list of stocks.
+         @param stocks List of stock symbols to fetch
+         @param start First date to fetch
+         @param end Last date to fetch
+         @return Tuple of a list of dates and a 2D array of prices with shape (dates, stocks), NaN where there is no price
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not provide price history")
+
+class YFinanceProvider(PriceProvider):
+    def fetchFastData(self, stocks, tickerData):
+        """
+         @brief Fetch the price data from yfinance over the network.
+         @param stocks List of stock symbols to fetch
+         @param tickerData StockTickerData to add the fetched data and failures to
+         @return Dict with ticker : {"lastPrice", "previousClose"} for each ticker that was fetched
+        """
+        return _fetchTickers(stocks, tickerData)
+
+    def fetchHistory(self, stocks, start, end):
+        """
+         @brief Fetch daily closing prices from yfinance in one download request.
+         @param stocks List of stock symbols to fetch
+         @param start First date to fetch
+         @param end Last date to fetch
+         @return Tuple of a list of dates and a 2D array of prices with shape (dates, stocks), NaN where there is no price
+        """
+        # yfinance pulls in pandas, so it is only imported once history is actually fetched from it
+        import yfinance as yf
+        history = yf.download(stocks, start = start, end = end + timedelta(days = 1), interval = "1d", group_by = "column",
+                              progress = False, threads = True, auto_adjust = True)
+        closes = history["Close"]
+        # A single symbol download may come back as a Series instead of a one column frame
+        if not hasattr(closes, "columns"):
+            closes = closes.to_frame(name = stocks[0])
+        closes = closes.reindex(columns = stocks)
+        return [timestamp.date() for timestamp in closes.index], closes.to_numpy(dtype = np.float64)
+
+class StaticProvider(PriceProvider):
+    def __init__(self, quotes, sourceName = "price snapshot"):
+        """
+         @brief Serve prices from a dictionary held in memory.
+         @param quotes Dict with ticker : price, or ticker : {"lastPrice", "previousClose"}
+         @param sourceName Name of where the quotes came from, used when a symbol is missing (default = "price snapshot")
+        """
+        self.sourceName = sourceName
+        self.quotes     = {}
+        # A plain price is used for both the last price and the previous close
+        for symbol, quote in quotes.items():
+            if not isinstance(quote, dict):
+                quote = {"lastPrice" : quote, "previousClose" : quote}
+            self.quotes[symbol] = quote
+
+    def fetchFastData(self, stocks, tickerData):
+        """
+         @brief Look up the price data in the snapshot.
+         @param stocks List of stock symbols to fetch
+         @param tickerData StockTickerData to add the found data and missing symbols to
+         @return Dict with ticker : {"lastPrice", "previousClose"} for each ticker in the snapshot
+        """
+        fastData = {}
+        # Symbols missing from the snapshot are reported like failed fetches
+        for symbol in stocks:
+            data = self.quotes.get(symbol)
+            if data is None:
+                tickerData.addFailedSymbol(symbol, f"Not found in {self.sourceName}")
+                continue
+            fastData[symbol] = data
+            tickerData.addTickerData(symbol, data)
+        return fastData
+
+class FileProvider(StaticProvider):
+    def __init__(self, filename):
+        """
+         @brief Load a quote snapshot from a local file. The file is read once and served from memory afterwards
+         @param filename Path to a JSON file ( {"AAPL": 123.4} or {"AAPL": {"lastPrice": 123.4, "previousClose": 120.1}} )
+            or a CSV file with rows of symbol, lastPrice and optionally previousClose
+        """
+        super().__init__(_readQuoteFile(filename), filename)
+        self.filename = filename
+
+class SyntheticProvider(PriceProvider):
+    def __init__(self, seed = 0):
+        """
+         @brief Generate deterministic prices without any input. The same symbol and seed always give the same price
+         @param seed Value mixed into every price so different runs can use different price sets (default = 0)
+        """
+        self.seed = seed
+
+    def fetchFastData(self, stocks, tickerData):
+        """
+         @brief Generate price data for each stock.
+         @param stocks List of stock symbols to generate prices for
+         @param tickerData StockTickerData to add the generated data to
+         @return Dict with ticker : {"lastPrice", "previousClose"} for every ticker in stocks
+        """
+        fastData = {}
+        for symbol in stocks:
+            data = self.getQuote(symbol)
+            fastData[symbol] = data
+            tickerData.addTickerData(symbol, data)
+        return fastData
+
+    def getQuote(self, symbol):
+        """
+         @brief Derive a stable price between $5 and $505 from the symbol, and a previous close within 2% of it.
+         @param symbol The stock symbol to generate a price for
+         @return Dict with "lastPrice" and "previousClose"
+        """
+        checksum = zlib.crc32(f"{symbol}:{self.seed}".encode())
+        lastPrice = 5 + (checksum % 50000) / 100
+        change = ((checksum >> 16) % 401 - 200) / 10000
+        return {"lastPrice"     : lastPrice,
+                "previousClose" : round(lastPrice * (1 + change), 2)}
+
+    def fetchHistory(self, stocks, start, end):
+        """
+         @brief Generate a daily random walk for each stock over the trading days between start and end. Each symbol's walk only
+            depends on the symbol and seed and ends at the symbol's getQuote price
+         @param stocks List of stock symbols to generate prices for
+         @param start First date to generate
+         @param end Last date to generate
+         @return Tuple of a list of trading dates and a 2D array of prices with shape (dates, stocks)
+        """
+        dates = getTradingDays(start, end)
+        prices = np.empty((len(dates), len(stocks)))
+        for i, symbol in enumerate(stocks):
+            rng = np.random.default_rng(zlib.crc32(f"{symbol}:{self.seed}".encode()))
+            logReturns = rng.normal(_SYNTHETIC_DRIFT, _SYNTHETIC_VOLATILITY, len(dates))
+            # Anchor the end of the walk to today's synthetic price
+            walk = np.exp(np.cumsum(logReturns) - logReturns.sum())
+            prices[:, i] = self.getQuote(symbol)["lastPrice"] * walk
+        return dates, prices
+
+def getPriceProvider(source = None, seed = 0):
+    """
+     @brief Create the provider for a price source given on the command line.
+     @param source None or "yfinance" for live prices, "synthetic" for generated prices, otherwise the path to a quote file
+        (default = None)
+     @param seed Seed for the synthetic provider (default = 0)
+     @return A PriceProvider instance
+    """
+    if not source or source == "yfinance":
+        return YFinanceProvider()
+    if source == "synthetic":
+        return SyntheticProvider(seed)
+    return FileProvider(source)
+
+def _readQuoteFile(filename):
+    """
+     @brief Read a JSON or CSV quote snapshot into a dictionary.
+     @param filename Path of the snapshot file. Files ending in .json are read as JSON, everything else as CSV
+     @return Dict with ticker : {"lastPrice", "previousClose"}. previousClose defaults to lastPrice when not given
+    """
+    quotes = {}
+    # JSON snapshot of either plain prices or price dictionaries
+    if os.path.splitext(filename)[1].lower() == ".json":
+        with open(filename) as f:
+            rawQuotes = json.load(f)
+        for symbol, quote in rawQuotes.items():
+            if isinstance(quote, dict):
+                lastPrice = float(quote["lastPrice"])
+                previousClose = float(quote.get("previousClose", lastPrice))
+            else:
+                lastPrice = previousClose = float(quote)
+            quotes[symbol] = {"lastPrice" : lastPrice, "previousClose" : previousClose}
+        return quotes
+
+    # CSV snapshot, skipping blank rows and a header row
+    with open(filename) as f:
+        for row in csv.reader(f):
+            row = [token.strip() for token in row]
+            if len(row) < 2 or not row[0]:
+                continue
+            try:
+                lastPrice = float(row[1])
+            except ValueError:
+                continue
+            previousClose = float(row[2]) if len(row) > 2 and row[2] else lastPrice
+            quotes[row[0]] = {"lastPrice" : lastPrice, "previousClose" : previousClose}
+    return quotes
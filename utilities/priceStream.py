@@ -0,0 +1,94 @@
+import sys
+import json
+import math
+import traceback
+from time import sleep
+from utilities.fetchStock import fetchLatestPrices, StockTickerData
+
+def readTicksFromFile(filename, follow = False, pollSeconds = 0.5):
+    """
+     @brief Read price ticks from a file or pipe, one batch per line. A line is either JSON ( {"AAPL": 190.1, "MSFT": 410.2} )
+        or comma / whitespace separated symbol and price pairs ( AAPL 190.1 MSFT 410.2 )
+     @param filename Path of the tick file, or "-" to read from standard input
+     @param follow Keep waiting for new lines at the end of a file instead of stopping, like tail -f (default = False)
+     @param pollSeconds How long to wait between checks for new lines when following (default = 0.5)
+     @return Generator of dictionaries of prices keyed by symbol
+    """
+    f = sys.stdin if filename == "-" else open(filename)
+    try:
+        lineNumber = 0
+        # Read until the end of the stream, or forever when following a file
+        while True:
+            line = f.readline()
+            if not line:
+                if follow and f is not sys.stdin:
+                    sleep(pollSeconds)
+                    continue
+                return
+            lineNumber += 1
+
+            ticks = _parseTickLine(line, lineNumber)
+            if ticks:
+                yield ticks
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def pollProvider(symbols, provider = None, intervalSeconds = 60, count = None):
+    """
+     @brief Poll a price provider for new prices at a fixed interval.
+     @param symbols List of stock symbols to poll
+     @param provider PriceProvider to poll. yfinance is used when not given (default = None)
+     @param intervalSeconds Seconds to wait between polls (default = 60)
+     @param count Number of polls before stopping. Polls forever when None (default = None)
+     @return Generator of dictionaries of prices keyed by symbol
+    """
+    polls = 0
+    # Each poll yields only the prices that moved since the previous one
+    lastPrices = {}
+    while count is None or polls < count:
+        if polls:
+            sleep(intervalSeconds)
+        polls += 1
+        try:
+            prices = fetchLatestPrices(symbols, StockTickerData(), provider = provider)
+        except Exception:
+            print("Could not fetch market data.")
+            traceback.print_exc()
+            continue
+
+        ticks = {symbol : price for symbol, price in prices.items() if lastPrices.get(symbol) != price}
+        lastPrices.update(ticks)
+        if ticks:
+            yield ticks
+
+def _parseTickLine(line, lineNumber):
+    """
+     @brief Parse one line of a tick stream. Malformed lines are reported and skipped
+     @param line The raw line
+     @param lineNumber Line number used in error messages
+     @return Dictionary of prices keyed by symbol, empty for blank or malformed lines
+    """
+    line = line.strip()
+    if not line:
+        return {}
+
+    try:
+        # JSON object of symbol to price
+        if line.startswith("{"):
+            ticks = {symbol : float(price) for symbol, price in json.loads(line).items()}
+        else:
+            # Alternating symbol and price tokens
+            tokens = line.replace(",", " ").split()
+            if len(tokens) % 2:
+                raise ValueError("expected symbol and price pairs")
+            ticks = {tokens[i] : float(tokens[i + 1]) for i in range(0, len(tokens), 2)}
+
+        # A price that is not a finite number greater than 0 would spoil every later table
+        for symbol, price in ticks.items():
+            if not math.isfinite(price) or price <= 0:
+                raise ValueError(f"price {price} of {symbol} must be a finite number greater than 0")
+        return ticks
+    except (TypeError, ValueError) as e:
+        print(f"Skipping malformed tick on line {lineNumber}: {e}")
+        return {}
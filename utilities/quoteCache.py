@@ -0,0 +1,94 @@
+import os
+import json
+import time
+import traceback
+from datetime import datetime
+from utilities.Constants import CacheConstants
+from utilities.marketCalendar import getSessionKey, getNextSessionOpen, getNewYorkTimezone
+
+class QuoteCache:
+    def __init__(self, cachePath = CacheConstants.QUOTE_CACHE_PATH, ttlSeconds = CacheConstants.INTRADAY_TTL_SECONDS):
+        """
+         @brief Initialize the cache and load any quotes saved by a previous run.
+         @param cachePath Path of the JSON file the quotes are persisted to (default = CacheConstants.QUOTE_CACHE_PATH)
+         @param ttlSeconds How long an intraday quote stays valid in seconds (default = CacheConstants.INTRADAY_TTL_SECONDS)
+        """
+        self.cachePath  = cachePath
+        self.ttlSeconds = ttlSeconds
+        self.quotes     = {}
+        self.load()
+
+    def load(self):
+        """
+         @brief Load the quotes from the cache file. A missing or unreadable file leaves the cache empty.
+        """
+        # Nothing to load on the first run
+        if not os.path.exists(self.cachePath):
+            return
+
+        try:
+            with open(self.cachePath) as f:
+                self.quotes = json.load(f)
+        except Exception:
+            print("Could not read quote cache, ignoring it.")
+            traceback.print_exc()
+            self.quotes = {}
+
+    def save(self):
+        """
+         @brief Write the quotes to the cache file. The file is replaced atomically so a crash never leaves it half written.
+        """
+        tempPath = f"{self.cachePath}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cachePath), exist_ok = True)
+            with open(tempPath, "w") as f:
+                json.dump(self.quotes, f)
+            os.replace(tempPath, self.cachePath)
+        except Exception:
+            traceback.print_exc()
+
+    def getPrices(self, symbols, now = None):
+        """
+         @brief Get the cached prices that are still valid for the current session.
+         @param symbols List of stock symbols to look up
+         @param now Epoch seconds to evaluate expiry against (default = None, meaning now)
+         @return A dictionary of prices keyed by symbol for the symbols that were found and not expired
+        """
+        now = time.time() if now is None else now
+        sessionKey = getSessionKey(datetime.fromtimestamp(now, getNewYorkTimezone()))
+        prices = {}
+        # Keep only entries from this session that have not expired
+        for symbol in symbols:
+            entry = self.quotes.get(symbol)
+            if entry and entry["session"] == sessionKey and now < entry["expires"]:
+                prices[symbol] = entry["price"]
+        return prices
+
+    def addPrices(self, prices, now = None):
+        """
+         @brief Store freshly fetched prices. Intraday quotes expire after ttlSeconds, closed-market quotes at the next session open.
+         @param prices A dictionary of prices keyed by symbol
+         @param now Epoch seconds the prices were fetched at (default = None, meaning now)
+        """
+        now = time.time() if now is None else now
+        newYorkNow = datetime.fromtimestamp(now, getNewYorkTimezone())
+        sessionKey = getSessionKey(newYorkNow)
+        # A closed market will not move until the next session opens
+        if sessionKey.startswith("open:"):
+            expires = now + self.ttlSeconds
+        else:
+            expires = getNextSessionOpen(newYorkNow).timestamp()
+
+        for symbol, price in prices.items():
+            self.quotes[symbol] = {"price"   : price,
+                                   "session" : sessionKey,
+                                   "expires" : expires}
+
+    def clear(self):
+        """
+         @brief Remove all quotes from the cache and the cache file.
+        """
+        self.quotes = {}
+        # Remove the persisted copy as well
+        if os.path.exists(self.cachePath):
+            os.remove(self.cachePath)
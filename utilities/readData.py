@@ -1,56 +1,113 @@
 import os
+import sys
 import csv
-import traceback
 from portfolioComponents.Position import Position
 from portfolioComponents.Portfolio import Portfolio
-from utilities.Constants import FileConstants
+from portfolioComponents.WeightTree import resolveGroupWeights
+from utilities.portfolioSnapshot import PortfolioSnapshot
+from utilities.gcPause import pausedGarbageCollection
+from utilities.Constants import FileConstants, GroupConstants, ReadConstants, SnapshotConstants
 
-def getPortfolioFromFile(filename = None):
+def getPortfolioFromFile(filename = None, quoteCache = None, priceProvider = None, snapshotDir = SnapshotConstants.SNAPSHOT_PATH):
     """
      @brief Reads a portfolio from a file.
      @param filename The name of the file to read. Must be a valid path
+     @param quoteCache Optional QuoteCache passed on to the Portfolio for price lookups (default = None)
+     @param priceProvider Optional PriceProvider passed on to the Portfolio. yfinance is used when not given (default = None)
+     @param snapshotDir Directory of parsed portfolio snapshots, None to always parse the file (default = SnapshotConstants.SNAPSHOT_PATH)
      @return A Portfolio object with the positions initialized
     """
-    positions = []
-    rawText = _readCSVFile(filename)
-    _stripBlankRows(rawText)   
-    _stripHeaderRow(rawText)    
-    
-    # Add a position to the positions list
-    for row in rawText:
-        tempPosition = Position(row)
-        positions.append(tempPosition)
-        
-    portfolio = Portfolio(positions)
+    positions = readPositionsFromFile(filename, snapshotDir)
+    portfolio = Portfolio(positions, quoteCache, priceProvider)
     return portfolio
 
-def _readCSVFile(filename):
+def readPositionsFromFile(filename = None, snapshotDir = SnapshotConstants.SNAPSHOT_PATH):
     """
-     @brief Reads a CSV file and returns a list of rows. This function is used to read the contents of a CSV file into a list
-     @param filename The name of the file to read
-     @return A list of lists of strings from the CSV file
+     @brief Reads the positions of a portfolio from a file without fetching any prices. Rows may place a position in groups
+        ( "US Equity/VTI" ) and give a group its weight ( "US Equity/,60" ). The file is read in one streaming pass, and
+        every malformed row is reported with its line number in a single exception once the whole file has been read.
+        A file that has not changed since it was last parsed is loaded from its snapshot instead
+     @param filename The name of the file to read. Must be a valid path
+     @param snapshotDir Directory of parsed portfolio snapshots, None to always parse the file (default = SnapshotConstants.SNAPSHOT_PATH)
+     @return A list of Position objects
     """
-    rawText = []
     if not filename:
         filename = _searchForCSV()
-    try:
-        with open(filename) as f:
-            csvReader = csv.reader(f, delimiter=',', quotechar='|')
-            for row in csvReader:
-                temp = row
-                # Remove whitespace from ends of token.
-                for i, entry in enumerate(temp):
-                    temp[i] = entry.strip()
-                rawText.append(row)
     
-    except Exception:
-        traceback.print_exc()
+    # Use the snapshot of the last parse if the file still matches it
+    if snapshotDir:
+        snapshot = PortfolioSnapshot(snapshotDir)
+        positions = snapshot.load(filename)
+        if positions is not None:
+            return positions
+        # Fingerprint the file before parsing so a change made while it is read is not saved under the old contents
+        fingerprint = snapshot.getFingerprint(filename)
+    
+    positions    = []
+    groupWeights = {}
+    errors       = []
+    errorCount   = 0
+    with pausedGarbageCollection(), open(filename, newline = "") as f:
+        # Add a position to the positions list
+        for lineNumber, row in _iterRows(f):
+            try:
+                # A symbol ending in the separator gives the weight of a group
+                if row[0].rstrip().endswith(GroupConstants.SEPARATOR):
+                    weight = float(row[1])
+                    groupPath = tuple(name.strip() for name in row[0].strip().split(GroupConstants.SEPARATOR)[:-1])
+                    groupWeights[groupPath] = weight / 100 if weight > 1 else weight
+                    continue
+                positions.append(Position(row))
+            except (ValueError, IndexError) as e:
+                errorCount += 1
+                if len(errors) < ReadConstants.MAX_REPORTED_ROWS:
+                    errors.append(f"  line {lineNumber}: {e} ({','.join(row)})")
     
-    # Raise exception if the file is empty
-    if len(rawText) == 0:
+    # Report every bad row at once so they can all be fixed in one go
+    if errorCount:
+        more = f"\n  ... and {errorCount - len(errors)} more" if errorCount > len(errors) else ""
+        raise Exception(f"{errorCount} malformed row(s) in {filename}:\n" + "\n".join(errors) + more)
+    if not positions:
         raise Exception(f"Specified file {filename} is empty")
     
-    return rawText
+    # Grouped weights are shares of their group until resolved against the whole portfolio
+    if groupWeights or any(position.group for position in positions):
+        resolveGroupWeights(positions, groupWeights)
+    if snapshotDir:
+        snapshot.save(filename, positions, fingerprint)
+    return positions
+
+def _iterRows(f):
+    """
+     @brief Stream the rows of a CSV file, skipping blank rows and the header row. Only one row is held in memory at a time.
+        Leading spaces are dropped by the reader, and float() and Position ignore the rest, so tokens are not stripped here
+     @param f An open file to read
+     @return A generator of (line number, row) tuples
+    """
+    csvReader = csv.reader(f, delimiter=',', quotechar='|', skipinitialspace = True)
+    headerChecked = False
+    for row in csvReader:
+        # Skip rows with nothing in them
+        if not row or not row[0].strip() and not "".join(row).strip():
+            continue
+        # The first row is a header when none of its tokens is a number
+        if not headerChecked:
+            headerChecked = True
+            if not any(_isNumber(token) for token in row):
+                continue
+        yield csvReader.line_num, row
+
+def _isNumber(token):
+    """
+     @brief Check if a token can be read as a float.
+     @param token The string to check
+     @return True if float(token) succeeds
+    """
+    try:
+        float(token)
+        return True
+    except ValueError:
+        return False
 
 def _searchForCSV():
     """
@@ -75,68 +132,11 @@ def _getFilenameConfirmation(filename):
     """
     acceptConfirmation = ["y", "yes"]
     print(f"Found file {filename} ({str(os.path.join(FileConstants.DIR_PATH, filename))})")
-    confirm = "Y"
+    # Without a terminal there is nobody to answer, so the file is not used
+    if not sys.stdin.isatty():
+        return False
     confirm = input(f"Use {filename} as input data? (Y/n): ")
     # Return true if the user is allowed to accept the confirmation.
     if confirm.lower() in acceptConfirmation:
         return True
     return False
-    
-def _stripBlankRows(rawText):
-    """
-     @brief Removes blank rows from rawText.
-     @param rawText A list of list of strings
-    """
-    blanks = []
-    
-    # Add blanks to the blanks list.
-    for rowIndex, row in enumerate(rawText):
-        # Append the row to the blanks list.
-        if not row or row == []:
-            blanks.append(rowIndex)
-            continue
-        
-        foundBlank = False
-        # Check if there is no blank characters in the row.
-        for token in row:
-            # If the token is blank or empty set foundBlank to true.
-            if not token or token.strip() == "":
-                foundBlank = True
-        
-        # Append the row index to the blanks list.
-        if foundBlank:
-            blanks.append(rowIndex)
-    
-    # Return the blanks if blanks.
-    if not blanks:
-        return
-    
-    # Removes all blanks from rawText.
-    blanks.reverse()
-    for blankIndex in blanks:
-        del rawText[blankIndex]
-
-def _stripHeaderRow(rawText):
-    """
-     @brief Strip header row from rawText. This is used to ensure that the first row is a float and not a row of headers
-     @param rawText text from which to strip the header row
-     @return text from rawText after stripping the header row
-    """
-    firstRow = rawText[0]
-   
-    # Check if no float values are in row
-    # Return the first row of the first row.
-    for token in firstRow:
-        try:
-            floatToken = float(token)
-            # Return the floatToken if it is a floatToken.
-            if isinstance(floatToken, float):
-                return
-        except ValueError:
-            continue
-        except Exception as e:
-            raise e
-    
-    # No floats found, remove first row
-    del rawText[0]
-        
\ No newline at end of file
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import sqlite3
+from datetime import datetime
+from utilities.Constants import RunHistoryConstants
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id          INTEGER PRIMARY KEY,
+    timestamp   REAL NOT NULL,
+    source      TEXT,
+    fingerprint TEXT,
+    amount      REAL NOT NULL,
+    invested    REAL NOT NULL,
+    balance     REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runPositions (
+    runId       INTEGER NOT NULL REFERENCES runs(id),
+    timestamp   REAL NOT NULL,
+    symbol      TEXT NOT NULL,
+    price       REAL NOT NULL,
+    change      REAL NOT NULL,
+    shares      REAL NOT NULL,
+    value       REAL NOT NULL,
+    weight      REAL NOT NULL,
+    target      REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runsByTimestamp ON runs(timestamp);
+CREATE INDEX IF NOT EXISTS runPositionsBySymbol ON runPositions(symbol, timestamp);
+CREATE INDEX IF NOT EXISTS runPositionsByTimestamp ON runPositions(timestamp);
+"""
+
+class RunHistory:
+    def __init__(self, dbPath = RunHistoryConstants.DB_PATH):
+        """
+         @brief Open the run history, creating it on first use. Runs are only ever added, never changed or removed. The
+            database is in write-ahead log mode so batch workers can record runs at the same time
+         @param dbPath Path of the SQLite database file (default = RunHistoryConstants.DB_PATH)
+        """
+        self.dbPath = dbPath
+        os.makedirs(os.path.dirname(os.path.abspath(dbPath)), exist_ok = True)
+        self.connection = sqlite3.connect(dbPath, timeout = RunHistoryConstants.BUSY_TIMEOUT_SECONDS)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(_SCHEMA)
+
+    def recordRun(self, portfolio, changes, amount, source = None, fingerprint = None, timestamp = None):
+        """
+         @brief Record a run: the prices used, what was bought and the weights that resulted. Written in one transaction
+         @param portfolio The Portfolio or ArrayPortfolio after the changes were applied
+         @param changes A dictionary of symbols to the amount bought
+         @param amount The amount that was contributed
+         @param source Name of the portfolio file (default = None)
+         @param fingerprint Fingerprint of the portfolio file, as returned by PortfolioSnapshot.getFingerprint (default = None)
+         @param timestamp Epoch seconds of the run (default = None, meaning now)
+         @return The id of the recorded run
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        # Read the weights from Position objects for either engine
+        if hasattr(portfolio, "refreshPercentages"):
+            portfolio.refreshPercentages()
+            positions = portfolio.positions
+        else:
+            positions = portfolio.toPositions()
+        latestPrices = portfolio.latestPrices
+        # Shares held after the run, since the share counts of the positions are left as they were read
+        rows = []
+        for pos in positions:
+            price = latestPrices.get(pos.symbol, 0)
+            shares = pos.currentValue / price if price else pos.quantityShares
+            rows.append((pos.symbol, price, changes.get(pos.symbol, 0), shares, pos.currentValue, pos.actualPercent, pos.percentWanted))
+
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (timestamp, source, fingerprint, amount, invested, balance) VALUES (?, ?, ?, ?, ?, ?)",
+                (timestamp, source, json.dumps(fingerprint) if fingerprint else None, amount, sum(changes.values()), portfolio.balance))
+            runId = cursor.lastrowid
+            self.connection.executemany(
+                "INSERT INTO runPositions (runId, timestamp, symbol, price, change, shares, value, weight, target) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((runId, timestamp) + row for row in rows))
+        return runId
+
+    def getTotalBought(self, symbol, start = None, end = None):
+        """
+         @brief Total amount bought of a symbol over a period.
+         @param symbol The symbol to total
+         @param start First date or datetime to include (default = None, meaning the first run)
+         @param end Last date or datetime to include (default = None, meaning the latest run)
+         @return The total amount bought
+        """
+        startStamp, endStamp = _getRange(start, end)
+        row = self.connection.execute(
+            "SELECT COALESCE(SUM(change), 0) FROM runPositions WHERE symbol = ? AND timestamp >= ? AND timestamp < ?",
+            (symbol, startStamp, endStamp)).fetchone()
+        return row[0]
+
+    def getWeightHistory(self, symbol, start = None, end = None):
+        """
+         @brief The weight of a symbol after every run over a period.
+         @param symbol The symbol to look up
+         @param start First date or datetime to include (default = None, meaning the first run)
+         @param end Last date or datetime to include (default = None, meaning the latest run)
+         @return A list of (datetime, actual weight, desired weight, amount bought) tuples, oldest first
+        """
+        startStamp, endStamp = _getRange(start, end)
+        rows = self.connection.execute(
+            "SELECT timestamp, weight, target, change FROM runPositions WHERE symbol = ? AND timestamp >= ? AND timestamp < ? "
+            "ORDER BY timestamp", (symbol, startStamp, endStamp))
+        return [(datetime.fromtimestamp(stamp), weight, target, change) for stamp, weight, target, change in rows]
+
+    def getRuns(self, start = None, end = None):
+        """
+         @brief The runs recorded over a period.
+         @param start First date or datetime to include (default = None, meaning the first run)
+         @param end Last date or datetime to include (default = None, meaning the latest run)
+         @return A list of (run id, datetime, source, amount, invested, balance) tuples, oldest first
+        """
+        startStamp, endStamp = _getRange(start, end)
+        rows = self.connection.execute(
+            "SELECT id, timestamp, source, amount, invested, balance FROM runs WHERE timestamp >= ? AND timestamp < ? "
+            "ORDER BY timestamp", (startStamp, endStamp))
+        return [(runId, datetime.fromtimestamp(stamp), source, amount, invested, balance)
+                for runId, stamp, source, amount, invested, balance in rows]
+
+    def close(self):
+        """
+         @brief Close the connection to the database.
+        """
+        self.connection.close()
+
+def _getRange(start, end):
+    """
+     @brief Convert an inclusive range of dates or datetimes to a half open range of epoch seconds.
+     @param start First date or datetime, None for no lower bound
+     @param end Last date or datetime, None for no upper bound. A date includes the whole day
+     @return Tuple of the start and end epoch seconds
+    """
+    startStamp = float("-inf") if start is None else _toTimestamp(start)
+    # A date as the end means up to the end of that day
+    if end is None:
+        endStamp = float("inf")
+    elif isinstance(end, datetime):
+        endStamp = end.timestamp()
+    else:
+        endStamp = datetime.fromordinal(end.toordinal() + 1).timestamp()
+    return startStamp, endStamp
+
+def _toTimestamp(day):
+    """
+     @brief Convert a date or datetime to epoch seconds. A date is taken at local midnight
+     @param day The date or datetime
+     @return Epoch seconds
+    """
+    if isinstance(day, datetime):
+        return day.timestamp()
+    return datetime(day.year, day.month, day.day).timestamp()
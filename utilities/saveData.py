@@ -1,56 +1,106 @@
 import os
+import sys
+import csv
 import traceback
+from contextlib import contextmanager
+from datetime import datetime
 from utilities.Constants import FileConstants
 
-if not os.path.exists(FileConstants.SAVE_PATH):
-    os.makedirs(FileConstants.SAVE_PATH)
+# Writers of the same file take turns on a lock where the platform has one
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 def checkForExistingFile(filename):
     """
-     @brief Checks if a file exists in the save path. If it does it appends a number to the filename so that it doesn't conflict with an existing file
+     @brief Checks if a file exists in the save path. If it does it is linked into the archive, so the new file can replace it
+        without its contents being lost and without the file ever going missing. Archived files are sharded by the date they
+        were written and named by the time they were written and the archiving process, so rotating a file takes the same few
+        system calls no matter how large the archive has grown
      @param filename Name of the file to check
      @return Filepath of the file to use.
     """
-    appendCount = 1
-    pathname    = FileConstants.SAVE_PATH
-    oldFilename = filename
-    oldFilePath = os.path.join(FileConstants.SAVE_PATH, oldFilename)
-    files       = os.listdir(pathname)
+    oldFilePath = os.path.join(FileConstants.SAVE_PATH, filename)
+    try:
+        writtenAt = datetime.fromtimestamp(os.stat(oldFilePath).st_mtime)
+    except FileNotFoundError:
+        return oldFilePath
     
-    # Append append count to the end of the file.
-    if filename in files:
-        pathname = FileConstants.ALT_SAVE_PATH
-        filename += ".bak"
-        if not os.path.exists(pathname):
-            os.makedirs(pathname)
-            
-        subfiles = os.listdir(pathname)
-        compFilename = filename
-        while compFilename in subfiles:
-            compFilename = f"{filename}{str(appendCount)}"
-            appendCount += 1
-        filename = compFilename
-        
-        # Move old files into archive
-        if pathname != FileConstants.SAVE_PATH:
-            newFilePath = os.path.join(pathname, filename)
-            os.rename(oldFilePath, newFilePath)    
-            
+    # Link old files into archive, the file itself stays in place until the new one replaces it
+    archivePath = os.path.join(FileConstants.ALT_SAVE_PATH, writtenAt.strftime(FileConstants.ARCHIVE_SHARD_FORMAT))
+    os.makedirs(archivePath, exist_ok = True)
+    archiveName = f"{filename}.{writtenAt.strftime(FileConstants.ARCHIVE_STAMP_FORMAT)}-{os.getpid()}"
+    archiveFilePath = os.path.join(archivePath, f"{archiveName}.bak")
+    attempt = 0
+    while True:
+        try:
+            os.link(oldFilePath, archiveFilePath)
+            break
+        except FileNotFoundError:
+            # The file was removed since it was checked, so there is nothing to archive
+            break
+        except FileExistsError:
+            # This version was already archived, otherwise another version was written at the same time on a coarse clock
+            if os.path.samefile(oldFilePath, archiveFilePath):
+                break
+            attempt += 1
+            archiveFilePath = os.path.join(archivePath, f"{archiveName}-{attempt}.bak")
+        except OSError:
+            # Without hard links the file is moved into the archive instead, leaving it missing until it is replaced
+            try:
+                os.rename(oldFilePath, archiveFilePath)
+            except FileNotFoundError:
+                pass
+            break
     return oldFilePath
 
+@contextmanager
+def _lockFile(filename):
+    """
+     @brief Hold an exclusive lock for a file while it is archived and replaced, so every version is archived before the next
+        one replaces it. The lock files are kept apart from the output files. Without fcntl the file is not locked
+     @param filename Name of the file in the save path to lock
+    """
+    if fcntl is None:
+        yield
+        return
+    lockPath = os.path.join(FileConstants.SAVE_PATH, FileConstants.LOCK_FILE_DIR)
+    os.makedirs(lockPath, exist_ok = True)
+    with open(os.path.join(lockPath, f"{filename}.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
 def printTableToFile(table, tableName):
     """
-     @brief Prints a table to a file. It will create a filename from the table name and write the table to that file
+     @brief Prints a table to a file. It will create a filename from the table name and write the table to that file.
+        The table is written next to the file and moved into place, so a reader never sees it half written. The previous file
+        is archived and replaced under a lock, so writers of the same table never lose each other's version
      @param table the table to be printed
      @param tableName the name of the table that will be printed
     """
     
-    filePath = checkForExistingFile(createFilenameFromTablename(tableName))
+    # The output directory is made the first time a table is written, not when this module is imported
+    os.makedirs(FileConstants.SAVE_PATH, exist_ok = True)
+    filename = createFilenameFromTablename(tableName)
+    filePath = os.path.join(FileConstants.SAVE_PATH, filename)
+    tempPath = f"{filePath}.{os.getpid()}.tmp"
     try:
-        with open(filePath, "w") as f:
+        with open(tempPath, "w") as f:
             f.writelines(table)
+        with _lockFile(filename):
+            checkForExistingFile(filename)
+            os.replace(tempPath, filePath)
     except:
         traceback.print_exc()
+        # Do not leave a table that was never moved into place behind
+        try:
+            os.remove(tempPath)
+        except OSError:
+            pass
         
 def createFilenameFromTablename(tableName):
     """
@@ -59,3 +109,22 @@ def createFilenameFromTablename(tableName):
      @return The filename as a string with. md appended to the table name as extension
     """
     return "".join(token for token in tableName.title() if not token.isspace()) + ".md"
+
+def writeAllocationMatrix(symbols, amounts, allocations, filePath = None):
+    """
+     @brief Write an allocation matrix as CSV, one row per contribution amount and one column per symbol
+     @param symbols List of symbols, in column order
+     @param amounts List of contribution amounts, in row order
+     @param allocations Rows of the amount bought of each symbol for each contribution
+     @param filePath Path of the CSV file to write. Written to standard output when None (default = None)
+    """
+    f = sys.stdout if filePath is None else open(filePath, "w", newline = "")
+    try:
+        writer = csv.writer(f)
+        writer.writerow(["Amount"] + list(symbols))
+        # One row per contribution amount
+        for amount, row in zip(amounts, allocations):
+            writer.writerow([f"{amount:.2f}"] + [f"{value:.2f}" for value in row])
+    finally:
+        if f is not sys.stdout:
+            f.close()